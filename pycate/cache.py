@@ -0,0 +1,197 @@
+"""
+Provides a thread-safe cache which coalesces concurrent loads of the
+same key
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Load:
+    """A load of a key which is in progress"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Cache:
+    """
+    A thread-safe TTL cache. When several threads ask for the same
+    missing key at once only one of them calls the loader, the others
+    wait for and share its result.
+
+    If stale_ttl is set, a value which has expired is still returned
+    for that many seconds afterwards while it is reloaded in the
+    background, so callers only wait for a load when there is no value
+    at all. Background loads run on at most max_workers threads and are
+    never duplicated.
+
+    Entries past their stale time are swept out as new values are
+    stored, so the cache only holds keys which are still in use.
+    """
+
+    def __init__(self, ttl=300, stale_ttl=0, max_workers=4, clock=time.monotonic):
+        """
+        :param ttl: The number of seconds a value is fresh for
+        :param stale_ttl: The number of seconds after a value expires
+        that it is still served while being refreshed
+        :param max_workers: The maximum number of background loads which
+        run at once
+        :param clock: Function returning the current time in seconds
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_workers = max_workers
+        self.clock = clock
+        self._entries = dict()
+        self._loads = dict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._sweep_at = 64
+
+    def get(self, key, loader):
+        """
+        Gets the value cached for key, calling loader() to load it if it
+        is missing or has expired. If the loader raises, the exception is
+        raised in every thread waiting on that load and nothing is cached
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > self.clock():
+            return entry[0]
+
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+
+            load = self._loads.get(key)
+
+            if entry is not None and entry[2] > now:
+                # Serve the stale value and refresh it in the background
+                if load is None:
+                    self.__submit(key, loader)
+                return entry[0]
+
+            owner = load is None
+            if owner:
+                load = self._loads[key] = _Load()
+
+        if owner:
+            self._load(key, loader, load)
+        else:
+            load.done.wait()
+
+        if load.error is not None:
+            raise load.error
+        return load.value
+
+    def prefetch(self, key, loader):
+        """
+        Loads key in the background unless it is fresh or already being
+        loaded
+        :return: True if a load was started
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                return False
+            if key in self._loads:
+                return False
+
+            self.__submit(key, loader)
+            return True
+
+    def __submit(self, key, loader):
+        # Must be called with the lock held
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        load = self._loads[key] = _Load()
+        self._executor.submit(self._load, key, loader, load)
+
+    def _load(self, key, loader, load):
+        try:
+            load.value = loader()
+        except Exception as e:
+            load.error = e
+
+        with self._lock:
+            # A load which was invalidated while it ran may have read the
+            # old value, so it is neither stored nor left for new callers
+            # to join
+            if self._loads.get(key) is load:
+                if load.error is None:
+                    self.__store(key, load.value)
+                del self._loads[key]
+
+        load.done.set()
+
+    def __store(self, key, value, ttl=None):
+        fresh_until = self.clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+
+        if len(self._entries) >= self._sweep_at:
+            self.__sweep()
+
+    def __sweep(self):
+        # Must be called with the lock held. Sweeping again only once the
+        # cache has doubled in size keeps the cost of stores constant
+        now = self.clock()
+        for key in [k for k, entry in self._entries.items() if entry[2] <= now]:
+            del self._entries[key]
+        self._sweep_at = max(64, 2 * len(self._entries))
+
+    def put(self, key, value, ttl=None):
+        """
+        Stores a value for key
+        :param ttl: The number of seconds the value is fresh for, by
+        default the cache's ttl. A ttl of 0 stores a value which is only
+        served stale, while it is reloaded
+        """
+        with self._lock:
+            self.__store(key, value, ttl)
+
+    def invalidate(self, key=None):
+        """
+        Removes key from the cache, or everything if key is None. Loads
+        of the key which are in progress are abandoned, so the next get
+        loads it again
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._loads.clear()
+            else:
+                self._entries.pop(key, None)
+                self._loads.pop(key, None)
+
+    def wait(self, timeout=None):
+        """
+        Waits for the loads currently in progress to finish
+        """
+        with self._lock:
+            loads = list(self._loads.values())
+
+        for load in loads:
+            load.done.wait(timeout)
+
+    def close(self):
+        """
+        Stops the background workers once their queued loads finish
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown()
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > self.clock()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,14 +1,33 @@
 """Provides the CATe class"""
 
 import datetime
+import gc
 import logging
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from bs4 import BeautifulSoup
 
-from pycate.const import __version__, CATE_BASE_URL, USER_AGENT_FORMAT
-from pycate.http import Http
-from pycate.models import UserInfo, Exercise, AssessedStatus, SubmissionStatus
+from pycate.const import (
+    __version__,
+    CATE_BASE_URL,
+    HANDIN_FIELD_NAME,
+    USER_AGENT_FORMAT,
+)
+from pycate.exceptions import ClientException, CATeException
+from pycate.http import Http, get_charset, get_wire_bytes
+from pycate.models import (
+    UserInfo,
+    Exercise,
+    AssessedStatus,
+    SubmissionStatus,
+    HandinResult,
+    PageStats,
+    Credentials,
+)
+from pycate.multipart import MultipartEncoder
 from pycate.urls import URLs
 from pycate.util import get_current_academic_year, month_search
 
@@ -17,15 +36,48 @@ class CATe(object):
     """
     The CATe class provides access to the data on CATe. Instances of
     this class are the way to interact with CATe
+
+    An instance created with thread_safe=True can be shared between
+    threads once it has been authenticated: its credentials can't be
+    changed afterwards, its get_* methods take no locks and its Http
+    connection pool and cache are thread-safe. Use for_user to get an
+    instance for another user which shares the same pool and cache
     """
 
-    def __init__(self, user_agent, http=None):
+    def __init__(
+        self,
+        user_agent,
+        http=None,
+        cache=None,
+        prefetch_notes=False,
+        bounded_memory=False,
+        collect_interval=16,
+        thread_safe=False,
+    ):
         """
         Initialize a CATe Instance
 
         :param user_agent: A helpful string to identify your application
         in its requests to CATe. Common strings include the name of the
         application and some way to identify you (e.g. DoC username)
+        :param cache: If not None, a pycate.cache.Cache which the
+        personal, timetable and notes pages are cached in. A Cache with
+        a stale_ttl serves stale pages immediately and refreshes them in
+        the background
+        :param prefetch_notes: If True and a cache is given, the notes
+        pages of the modules on a timetable are fetched in the background
+        as soon as the timetable has been loaded
+        :param bounded_memory: If True, parse trees are torn down and
+        collected as soon as values have been extracted from them, and
+        repeated strings such as module names are interned, so memory
+        stays flat in long-running processes
+        :param collect_interval: In bounded memory mode, the number of
+        parse trees to release between full garbage collections. html5lib
+        leaves reference cycles behind, so this bounds how much garbage
+        can build up between collections
+        :param thread_safe: If True, the instance can't be
+        re-authenticated once authentication has succeeded, so that it
+        can be shared between threads
         """
 
         if http is None:
@@ -33,23 +85,67 @@ class CATe(object):
         else:
             self.__http = http
 
-        self._is_authenticated = False
-        self._username = ""
-        self._password = ""
+        self.__credentials = Credentials("", "", False)
+        self.__thread_safe = thread_safe
         self.logger = logging.getLogger("pycate")
 
+        self.__cache = cache
+        self.__prefetch_notes = prefetch_notes
+        self.__bounded_memory = bounded_memory
+        self.__intern = sys.intern if bounded_memory else str
+        self.__collect_interval = collect_interval
+        self.__released = 0
+
+        # The PageStats of the last personal, timetable and notes pages
+        # fetched, keyed by page name
+        self.page_stats = dict()
+
         self.logger.debug(
             "Initialised PyCate v{v} with user agent `{ua}`".format(
                 v=__version__, ua=self.__http.user_agent
             )
         )
 
+    @property
+    def _username(self):
+        return self.__credentials.username
+
+    @property
+    def _password(self):
+        return self.__credentials.password
+
+    @property
+    def _is_authenticated(self):
+        return self.__credentials.authenticated
+
     def is_authenticated(self):
         """
         :return: Whether or not the CATe instance is authenticated
         """
         return self._is_authenticated
 
+    def for_user(self, username, password):
+        """
+        Creates and authenticates a CATe instance for another user which
+        shares this instance's Http (and so its connection pool), cache
+        and settings
+        :param username: The username to authenticate with
+        :param password: The password to authenticate with
+        :return: The new instance, check is_authenticated to see whether
+        authentication succeeded
+        """
+        cate = CATe(
+            self.__http.user_agent,
+            http=self.__http,
+            cache=self.__cache,
+            prefetch_notes=self.__prefetch_notes,
+            bounded_memory=self.__bounded_memory,
+            collect_interval=self.__collect_interval,
+            thread_safe=self.__thread_safe,
+        )
+        cate.authenticate(username, password)
+        return cate
+
     def authenticate(self, username, password):
         """
         Authenticates a user against CATe. If authentication succeeds
@@ -59,6 +155,11 @@ class CATe(object):
         :param password: The password to authenticate with
         :return: True if authentication was successful, False otherwise
         """
+        if self.__thread_safe and self._is_authenticated:
+            raise ClientException(
+                "A thread-safe CATe instance can't be re-authenticated, "
+                "use for_user instead"
+            )
 
         self.logger.debug(
             "Authenticating user {user} (with password: {pw})".format(
@@ -71,17 +172,13 @@ class CATe(object):
         if r.status_code == 200:
             # Authorization succeeded
             self.logger.debug("Authentication succeeded")
-            self._is_authenticated = True
-            self._username = username
-            self._password = password
+            self.__credentials = Credentials(username, password, True)
             return True
 
         if r.status_code == 401:
             # Unauthorized
             self.logger.warning("Authentication failed")
-            self._is_authenticated = False
-            self._username = ""
-            self._password = ""
+            self.__credentials = Credentials("", "", False)
             return False
 
     def get_user_info(self) -> UserInfo:
@@ -96,23 +193,26 @@ class CATe(object):
 
         url = URLs.personal(get_current_academic_year()[0], self._username)
 
-        response = self.__get(url)
-        soup = BeautifulSoup(response.text, "html5lib")
+        soup = self.__get_soup(url, "personal")
 
         user_info_table = soup.form.table.tbody.tr.find_all("td")[1].table.tbody
         uit_rows = user_info_table.find_all("tr")
 
-        return UserInfo(
+        user_info = UserInfo(
             uit_rows[0].find_all("td")[1].text,
             uit_rows[1].find_all("td")[0].b.text,
             uit_rows[1].find_all("td")[2].b.text,
-            uit_rows[2].find_all("td")[0].b.text,
-            uit_rows[2].find_all("td")[2].b.text,
-            uit_rows[3].find_all("td")[0].b.text,
+            self.__intern(uit_rows[2].find_all("td")[0].b.text),
+            self.__intern(uit_rows[2].find_all("td")[2].b.text),
+            self.__intern(uit_rows[3].find_all("td")[0].b.text),
             uit_rows[4].find_all("td")[0].b.text,
             "{x[0]} {x[2]}".format(x=uit_rows[5].find_all("td")[0].b.contents),
         )
 
+        self.__release(soup)
+
+        return user_info
+
     def get_default_period_and_class(self, period=None, clazz=None):
         """
         Gets the default period and class for the current user. If both
@@ -134,8 +234,7 @@ class CATe(object):
 
         url = URLs.personal(get_current_academic_year()[0], self._username)
 
-        response = self.__get(url)
-        soup = BeautifulSoup(response.text, "html5lib")
+        soup = self.__get_soup(url, "personal")
         timetable_selection_table = soup.form.table.tbody.contents[2].tr.find_all(
             "table"
         )
@@ -157,17 +256,21 @@ class CATe(object):
                     clazz = c_input["value"]
                     break
 
+        self.__release(soup)
+
         return period, clazz
 
     def __get_timetable_table_rows(self, period=None, clazz=None):
-        response = self.__get(
+        soup = self.__get_soup(
             URLs.timetable(
                 get_current_academic_year()[0], period, clazz, self._username
-            )
+            ),
+            "timetable",
         )
-        soup = BeautifulSoup(response.text, "html5lib")
 
-        self.logger.debug("Timetable data received, parsing...")
+        self.logger.debug(
+            "Timetable data received: {}".format(self.page_stats["timetable"])
+        )
 
         return soup.body.contents[3].tbody.find_all("tr")
 
@@ -190,7 +293,10 @@ class CATe(object):
 
         period, clazz = self.get_default_period_and_class(period, clazz)
 
-        if timetable_table_rows is None:
+        # Only release the parse tree if it was fetched here rather than
+        # passed in by the caller
+        owns_rows = timetable_table_rows is None
+        if owns_rows:
             timetable_table_rows = self.__get_timetable_table_rows(period, clazz)
 
         # Find rows containing modules
@@ -213,7 +319,7 @@ class CATe(object):
                     if module_td.a is not None:
                         module_notes_key = module_td.a["href"].split("=")[-1]
 
-                    module_info = {"name": row_tds[1].text.strip()}
+                    module_info = {"name": self.__intern(row_tds[1].text.strip())}
 
                     if module_notes_key:
                         module_info["notes_key"] = module_notes_key
@@ -224,6 +330,14 @@ class CATe(object):
 
                     module_rows.append(module_info)
 
+        if owns_rows:
+            self.__release(timetable_table_rows[0])
+
+        if self.__cache is not None and self.__prefetch_notes:
+            for module in module_rows:
+                if "notes_key" in module:
+                    self.__prefetch(URLs.module_notes(module["notes_key"]))
+
         return module_rows
 
     def get_exercise_timetable(self, period=None, clazz=None):
@@ -331,8 +445,8 @@ class CATe(object):
             # Construct object for module information. Number and name
             # are (for example) '113' and 'Architecture' respectively.
             module_info = {
-                "number": module["name"].split(" ")[0],
-                "name": " ".join(module["name"].split(" ")[2:]),
+                "number": self.__intern(module["name"].split(" ")[0]),
+                "name": self.__intern(" ".join(module["name"].split(" ")[2:])),
             }
 
             for row_index, row in enumerate(timetable_table_rows[start_row:end_row]):
@@ -456,10 +570,10 @@ class CATe(object):
                     exercise = Exercise(
                         module_info["number"],
                         module_info["name"],
-                        exercise_code,
+                        self.__intern(exercise_code),
                         exercise_name,
-                        exercise_start.strftime("%Y-%m-%d"),
-                        exercise_end.strftime("%Y-%m-%d"),
+                        self.__intern(exercise_start.strftime("%Y-%m-%d")),
+                        self.__intern(exercise_end.strftime("%Y-%m-%d")),
                         exercise_assessed_status,
                         exercise_submission_status,
                         exercise_links,
@@ -468,6 +582,8 @@ class CATe(object):
 
                     exercises.append(exercise)
 
+        self.__release(timetable_table_rows[0])
+
         self.logger.debug(
             "Found {} modules, {} exercises".format(len(module_rows), len(exercises))
         )
@@ -480,8 +596,7 @@ class CATe(object):
         :param notes_key: Notes key to query from
         :return: A list containing dictionaries with note info in
         """
-        response = self.__get(URLs.module_notes(notes_key))
-        soup = BeautifulSoup(response.text, "html5lib")
+        soup = self.__get_soup(URLs.module_notes(notes_key), "notes")
         note_rows = soup.form.tbody.tbody.find_all("tr")[1:-1]
         notes = list()
         for row in note_rows:
@@ -490,8 +605,8 @@ class CATe(object):
             note_obj["number"] = tds[0].text
             note_obj["title"] = tds[1].text
             note_obj["size"] = tds[3].text
-            note_obj["loaded"] = tds[4].text
-            note_obj["owner"] = tds[5].text
+            note_obj["loaded"] = self.__intern(tds[4].text)
+            note_obj["owner"] = self.__intern(tds[5].text)
             note_obj["hits"] = tds[6].text
 
             if tds[2].text == "URL*":
@@ -499,24 +614,283 @@ class CATe(object):
                 if tds[1].a:
                     note_obj["url"] = tds[1].a["title"]
             else:
-                note_obj["type"] = tds[2].text
+                note_obj["type"] = self.__intern(tds[2].text)
                 if tds[1].a:
                     note_obj["filekey"] = tds[1].a["href"][17:]
 
             notes.append(note_obj)
 
+        self.__release(soup)
+
         return notes
 
-    def __get(self, url, username=None, password=None):
+    def download_file(self, filekey, path):
+        """
+        Downloads a file (e.g. a note or spec) to disk without loading it
+        into memory
+        :param filekey: The key of the file, e.g. a note's filekey or an
+        exercise's spec_key
+        :param path: The path to save the file to
+        :return: The path the file was saved to
+        """
+        url = URLs.show_file(filekey)
+        self.logger.debug("Downloading {} to {}".format(url, path))
+
+        credentials = self.__credentials
+        status_code = self.__http.download(
+            url, credentials.username, credentials.password, path
+        )
+        if status_code != 200:
+            raise CATeException(
+                "CATe returned status {} for {}".format(status_code, url)
+            )
+
+        return path
+
+    def submit_exercise(
+        self, exercise, paths, period=None, clazz=None, progress=None, verify=True
+    ):
+        """
+        Hands in files for a single exercise. See submit_exercises
+        :param exercise: The Exercise to hand in
+        :param paths: A list of paths of the files to upload
+        :return: A HandinResult for the exercise
+        """
+        return self.submit_exercises(
+            [(exercise, paths)],
+            period,
+            clazz,
+            max_workers=1,
+            progress=progress,
+            verify=verify,
+        )[0]
+
+    def submit_exercises(
+        self,
+        submissions,
+        period=None,
+        clazz=None,
+        max_workers=4,
+        progress=None,
+        verify=True,
+    ):
+        """
+        Hands in files for several exercises concurrently. Files are
+        streamed to CATe so they are never fully loaded into memory
+        :param submissions: An iterable of (exercise, paths) tuples
+        where paths is a list of paths of the files to upload
+        :param period: The period containing the exercises, used when
+        verifying the submissions, by default uses the current one
+        :param clazz: The class containing the exercises, used when
+        verifying the submissions, by default uses the user's current
+        class
+        :param max_workers: The maximum number of concurrent uploads
+        :param progress: If not None, called as
+        progress(exercise, bytes_sent, bytes_total) as each upload
+        progresses. It may be called from several threads at once
+        :param verify: If True the exercise timetable is re-read after
+        uploading to find the new submission status of each exercise
+        :return: A list of HandinResults in the same order as
+        submissions. An upload which raises, e.g. because a file is
+        missing or the connection failed, doesn't stop the others and
+        its result has the exception as its error
+        """
+        submissions = list(submissions)
+
+        for exercise, _ in submissions:
+            if "handin" not in exercise.links:
+                raise ClientException("{} has no hand-in link".format(exercise))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self.__try_hand_in, exercise, paths, progress)
+                for exercise, paths in submissions
+            ]
+            uploads = [future.result() for future in futures]
+
+        accepted = any(
+            status_code is not None and 200 <= status_code < 300
+            for status_code, _, _ in uploads
+        )
+
+        if self.__cache is not None and accepted:
+            # The cached timetable shows the submission statuses from
+            # before the upload
+            self.__invalidate_timetable(period, clazz)
+
+        statuses = dict()
+        if verify and accepted:
+            self.logger.debug("Verifying {} submissions...".format(len(uploads)))
+            for exercise in self.get_exercise_timetable(period, clazz):
+                if "handin" in exercise.links:
+                    statuses[exercise.links["handin"]] = exercise.submission_status
+
+        return [
+            HandinResult(
+                exercise,
+                status_code,
+                bytes_sent,
+                statuses.get(exercise.links["handin"], SubmissionStatus.UNKNOWN),
+                error,
+            )
+            for (exercise, _), (status_code, bytes_sent, error) in zip(
+                submissions, uploads
+            )
+        ]
+
+    def __invalidate_timetable(self, period=None, clazz=None):
+        """
+        Internal method which removes a timetable page from the cache
+        """
+        period, clazz = self.get_default_period_and_class(period, clazz)
+        url = URLs.timetable(
+            get_current_academic_year()[0], period, clazz, self._username
+        )
+        self.__cache.invalidate((url, self._username))
+
+    def __try_hand_in(self, exercise, paths, progress=None):
+        """
+        Internal method which hands in an exercise, catching any error
+        so that it doesn't lose the results of the other hand-ins
+        :return: A tuple of the status code, the number of bytes sent and
+        the error, if any
+        """
+        try:
+            status_code, bytes_sent = self.__hand_in(exercise, paths, progress)
+        except Exception as e:
+            self.logger.warning("Failed to hand in {}: {!r}".format(exercise, e))
+            return None, 0, e
+        return status_code, bytes_sent, None
+
+    def __hand_in(self, exercise, paths, progress=None):
+        callback = None
+        if progress is not None:
+
+            def callback(bytes_sent, bytes_total):
+                progress(exercise, bytes_sent, bytes_total)
+
+        body = MultipartEncoder(
+            files=[(HANDIN_FIELD_NAME, path) for path in paths], callback=callback
+        )
+
+        self.logger.debug(
+            "Handing in {} files ({} bytes) for {}".format(
+                len(paths), len(body), exercise
+            )
+        )
+
+        try:
+            response = self.__post(exercise.links["handin"], body, body.content_type)
+        finally:
+            body.close()
+
+        return response.status_code, body.bytes_read
+
+    def __post(self, url, data, content_type):
+        """
+        Internal method which POSTs data to CATe with the saved
+        credentials
+        :param url: The URL to perform a POST request to
+        :return: The results of the POST request or None if no instance
+        """
+        if self.__http:
+            credentials = self.__credentials
+            return self.__http.post(
+                url, credentials.username, credentials.password, data, content_type
+            )
+        else:
+            return None
+
+    def __get_soup(self, url, page):
+        """
+        Internal method which GETs a page and parses it straight from the
+        response bytes, skipping requests' charset detection and decode
+        :param url: The URL of the page
+        :param page: The name to record the page's PageStats under
+        :return: The parsed page
+        """
+        if self.__cache is None:
+            content, charset, wire_bytes = self.__get_page(url)
+        else:
+            # The loader may run in the background after the credentials
+            # have changed, so it uses the ones the key was made with
+            credentials = self.__credentials
+            content, charset, wire_bytes = self.__cache.get(
+                (url, credentials.username),
+                lambda: self.__get_page(url, True, credentials),
+            )
+
+        start = time.perf_counter()
+        soup = BeautifulSoup(content, "html5lib", from_encoding=charset)
+        parse_seconds = time.perf_counter() - start
+
+        self.page_stats[page] = PageStats(url, wire_bytes, len(content), parse_seconds)
+
+        return soup
+
+    def __release(self, tag):
+        """
+        Internal method which, in bounded memory mode, tears down the
+        parse tree containing tag and periodically collects the cycles
+        html5lib leaves behind, which would otherwise wait for a full
+        garbage collection however large they grow
+        """
+        if not self.__bounded_memory:
+            return
+
+        while tag.parent is not None:
+            tag = tag.parent
+        tag.decompose()
+
+        self.__released += 1
+        if self.__released % self.__collect_interval == 0:
+            gc.collect()
+
+    def __get_page(self, url, check_status=False, credentials=None):
+        """
+        Internal method which GETs a page
+        :param check_status: If True raise a CATeException rather than
+        returning an unsuccessful response, so that it isn't cached
+        :param credentials: The Credentials to fetch the page with, by
+        default the current ones
+        :return: A tuple of the page's content, charset and size on the
+        wire
+        """
+        response = self.__get(url, credentials=credentials)
+
+        if check_status and response.status_code != 200:
+            raise CATeException(
+                "CATe returned status {} for {}".format(response.status_code, url)
+            )
+
+        return response.content, get_charset(response), get_wire_bytes(response)
+
+    def __prefetch(self, url):
+        """
+        Internal method which loads a page into the cache in the
+        background
+        """
+        credentials = self.__credentials
+        if self.__cache.prefetch(
+            (url, credentials.username),
+            lambda: self.__get_page(url, True, credentials),
+        ):
+            self.logger.debug("Prefetching {}".format(url))
+
+    def __get(self, url, username=None, password=None, credentials=None):
         """
         Internal method which checks if the CATe instance has an Http
         instance then calls the get method
         :param url: The URL to perform a GET request to
+        :param credentials: The Credentials to use if no username and
+        password are given, by default the current ones
         :return: The results of the GET request or None if no instance
         """
         if self.__http:
             if not username and not password:
-                return self.__http.get(url, self._username, self._password)
+                if credentials is None:
+                    credentials = self.__credentials
+                return self.__http.get(url, credentials.username, credentials.password)
             else:
                 return self.__http.get(url, username, password)
         else:
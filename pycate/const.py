@@ -3,3 +3,6 @@ __version__ = "0.1.0.dev1"
 USER_AGENT_FORMAT = "{{}} (PyCate/{})".format(__version__)
 
 CATE_BASE_URL = "https://cate.doc.ic.ac.uk/"
+
+# Name of the form field files are uploaded in when handing in
+HANDIN_FIELD_NAME = "file"
@@ -7,3 +7,11 @@ class PyCateException(Exception):
 
 class ClientException(PyCateException):
     """Exceptions that don't involve interaction with CATe"""
+
+
+class CATeException(PyCateException):
+    """Exceptions caused by an unexpected response from CATe"""
+
+
+class SnapshotException(ClientException):
+    """Exceptions caused by a snapshot file which can't be loaded"""
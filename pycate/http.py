@@ -1,18 +1,128 @@
+import os
+import re
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
 import requests
+from requests.adapters import HTTPAdapter
 
+from pycate.const import CATE_BASE_URL
 from pycate.exceptions import ClientException
 
 
 class Http:
-    def __init__(self, user_agent):
+    """
+    Sends requests to CATe, reusing connections from a pool shared by
+    every thread using the instance. Each thread has its own
+    requests.Session, as sessions aren't thread-safe, and none of them
+    keep cookies, so requests made with different credentials can't
+    affect each other
+    """
+
+    def __init__(self, user_agent, base_url=None, pool_size=10):
+        """
+        :param user_agent: The user agent to send with every request
+        :param base_url: If not None, requests to CATe are sent to this
+        URL instead, e.g. to talk to a local stand-in server
+        :param pool_size: The maximum number of connections kept open to
+        each host
+        """
         if not user_agent:
             raise ClientException("User agent error")
         self.user_agent = user_agent
+        self.base_url = base_url
+
+        self.__adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.__local = threading.local()
+
+    def _session(self):
+        session = getattr(self.__local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.mount("http://", self.__adapter)
+            session.mount("https://", self.__adapter)
+            self.__local.session = session
+        return session
+
+    def _url(self, url):
+        if self.base_url is not None and url.startswith(CATE_BASE_URL):
+            return self.base_url + url[len(CATE_BASE_URL) :]
+        return url
 
     def get(self, url, username, password):
         if username is None or password is None:
             raise ClientException("Username or password is None")
 
-        return requests.get(
-            url, headers={"User-Agent": self.user_agent}, auth=(username, password)
+        return self._session().get(
+            self._url(url),
+            headers={"User-Agent": self.user_agent, "Accept-Encoding": "gzip, deflate"},
+            auth=(username, password),
         )
+
+    def post(self, url, username, password, data, content_type):
+        """
+        POSTs data to the given URL. If data is a file-like object it is
+        streamed rather than loaded into memory
+        """
+        if username is None or password is None:
+            raise ClientException("Username or password is None")
+
+        return self._session().post(
+            self._url(url),
+            data=data,
+            headers={"User-Agent": self.user_agent, "Content-Type": content_type},
+            auth=(username, password),
+        )
+
+    def download(self, url, username, password, path, chunk_size=65536):
+        """
+        Streams the body of a GET request to a file. The file is only
+        written if the request succeeds
+        :return: The status code of the response
+        """
+        if username is None or password is None:
+            raise ClientException("Username or password is None")
+
+        with self._session().get(
+            self._url(url),
+            headers={"User-Agent": self.user_agent},
+            auth=(username, password),
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                return response.status_code
+
+            partial_path = path + ".part"
+            with open(partial_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+            os.replace(partial_path, path)
+
+            return response.status_code
+
+
+def get_charset(response):
+    """
+    :return: The charset given in the Content-Type header of a response,
+    or None if it doesn't give one and the page should be sniffed
+    """
+    match = re.search(
+        r"charset=[\"']?([\w.:-]+)", response.headers.get("Content-Type", ""), re.I
+    )
+    return match.group(1) if match else None
+
+
+def get_wire_bytes(response):
+    """
+    :return: The number of bytes a response body took on the wire, which
+    is smaller than its content if it was compressed
+    """
+    if "Content-Length" in response.headers:
+        return int(response.headers["Content-Length"])
+
+    raw = getattr(response, "raw", None)
+    if raw is not None and hasattr(raw, "tell"):
+        return raw.tell()
+
+    return len(response.content)
@@ -0,0 +1,547 @@
+"""
+Provides a job queue for spreading scraping across many workers and
+machines. Work items are timetable fetches for a user, notes fetches for
+a module and file downloads. Jobs are deduplicated by key while they are
+pending or running, so a notes page which many users can see is only
+fetched once, and are claimed with a lease which is renewed while they
+run, so the jobs of a worker which dies are picked up by another.
+
+    broker = SQLiteBroker("jobs.db")
+    broker.put(*timetable_job("abc123", "4", "c1"))
+    Worker(broker, cate_handlers(get_cate, broker, "downloads")).run()
+"""
+
+import json
+import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+TIMETABLE = "timetable"
+NOTES = "notes"
+DOWNLOAD = "download"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def timetable_job(user, period=None, clazz=None):
+    """
+    :return: The (kind, key, payload) of a job fetching a user's exercise
+    timetable and modules
+    """
+    return (
+        TIMETABLE,
+        "{}:{}:{}:{}".format(TIMETABLE, user, period, clazz),
+        {"user": user, "period": period, "class": clazz},
+    )
+
+
+def notes_job(notes_key, user=None):
+    """
+    :return: The (kind, key, payload) of a job fetching a module's notes.
+    The key doesn't include the user, so the job is shared by everyone
+    who can see the notes
+    :param user: The user whose credentials to fetch the notes with
+    """
+    return (
+        NOTES,
+        "{}:{}".format(NOTES, notes_key),
+        {"notes_key": notes_key, "user": user},
+    )
+
+
+def download_job(filekey, path, user=None):
+    """
+    :return: The (kind, key, payload) of a job downloading a file
+    """
+    return (
+        DOWNLOAD,
+        "{}:{}".format(DOWNLOAD, filekey),
+        {"filekey": filekey, "path": path, "user": user},
+    )
+
+
+class Job:
+    def __init__(self, id, kind, key, payload, attempts, max_attempts, owner):
+        self.id = id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.owner = owner
+
+    def __str__(self):
+        return "Job{{{};Attempt={}/{}}}".format(
+            self.key, self.attempts, self.max_attempts
+        )
+
+
+class Broker(ABC):
+    """
+    The interface job queue backends implement. Every method must be
+    safe to call from many threads and processes at once
+    """
+
+    @abstractmethod
+    def put(self, kind, key, payload, max_attempts=3, requeue_after=0):
+        """
+        Adds a job unless one with the same key is already pending or
+        running. A finished (done or failed) job with the same key is
+        queued again with the new payload, so jobs can be refreshed
+        :param requeue_after: Only queue a finished job again if it
+        finished at least this many seconds ago
+        :return: True if the job was added
+        """
+
+    @abstractmethod
+    def claim(self, owner, lease):
+        """
+        Claims the next available job, which is either pending or was
+        claimed by a worker whose lease has expired
+        :param owner: An identifier of the claiming worker
+        :param lease: The number of seconds the job is leased for
+        :return: The claimed Job, or None if there are none available
+        """
+
+    @abstractmethod
+    def heartbeat(self, job, lease):
+        """
+        Extends the lease on a job
+        :return: False if the lease has been lost to another worker
+        """
+
+    @abstractmethod
+    def complete(self, job, result):
+        """
+        Marks a job as done, storing its (JSON serialisable) result
+        :return: False if the lease has been lost to another worker
+        """
+
+    @abstractmethod
+    def fail(self, job, error, retry_delay):
+        """
+        Records that a job failed. It is retried after retry_delay
+        seconds unless it has run out of attempts
+        :return: False if the lease has been lost to another worker
+        """
+
+    @abstractmethod
+    def result(self, key):
+        """
+        :return: The result of the finished job with the given key, or
+        None
+        """
+
+    @abstractmethod
+    def counts(self):
+        """
+        :return: A dictionary of the number of jobs in each state
+        """
+
+    def close(self):
+        """
+        Releases anything the calling thread holds open, such as its
+        connection. The broker can still be used afterwards
+        """
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    owner TEXT,
+    available_at REAL NOT NULL,
+    lease_expires REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_available ON jobs (state, available_at);
+"""
+
+
+class SQLiteBroker(Broker):
+    """
+    A Broker storing jobs in a SQLite file, which any number of worker
+    threads and processes on the same machine can share. Scaling out
+    across machines needs a Broker backed by a shared service instead
+    """
+
+    def __init__(self, path, clock=time.time):
+        """
+        :param path: The path of the SQLite file
+        :param clock: Function returning the current (wall clock) time in
+        seconds, which must agree between processes
+        """
+        self.path = path
+        self.clock = clock
+        self.__local = threading.local()
+
+        self.__connection().executescript(_SCHEMA)
+
+    def close(self):
+        db = getattr(self.__local, "db", None)
+        if db is not None:
+            self.__local.db = None
+            db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __connection(self):
+        # sqlite3 connections can't be shared between threads
+        db = getattr(self.__local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self.__local.db = db
+        return db
+
+    def __transaction(self):
+        return _Transaction(self.__connection())
+
+    def put(self, kind, key, payload, max_attempts=3, requeue_after=0):
+        with self.__transaction() as db:
+            payload = json.dumps(payload)
+
+            # Reset a finished job rather than adding a second one, as
+            # keys are unique
+            if db.execute(
+                "UPDATE jobs SET kind = ?, payload = ?, state = ?, attempts = 0, "
+                "max_attempts = ?, owner = NULL, available_at = 0, "
+                "lease_expires = NULL, finished_at = NULL, result = NULL, "
+                "error = NULL WHERE key = ? AND state IN (?, ?) "
+                "AND finished_at <= ?",
+                (
+                    kind,
+                    payload,
+                    PENDING,
+                    max_attempts,
+                    key,
+                    DONE,
+                    FAILED,
+                    self.clock() - requeue_after,
+                ),
+            ).rowcount:
+                return True
+
+            return (
+                db.execute(
+                    "INSERT OR IGNORE INTO jobs "
+                    "(key, kind, payload, state, max_attempts, available_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, kind, payload, PENDING, max_attempts, 0),
+                ).rowcount
+                == 1
+            )
+
+    def claim(self, owner, lease):
+        with self.__transaction() as db:
+            now = self.clock()
+            while True:
+                row = db.execute(
+                    "SELECT id, kind, key, payload, attempts, max_attempts "
+                    "FROM jobs WHERE (state = ? AND available_at <= ?) "
+                    "OR (state = ? AND lease_expires <= ?) "
+                    "ORDER BY id LIMIT 1",
+                    (PENDING, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+
+                job_id, kind, key, payload, attempts, max_attempts = row
+                if attempts < max_attempts:
+                    break
+
+                # The lease expired on the job's last attempt
+                db.execute(
+                    "UPDATE jobs SET state = ?, error = ?, finished_at = ? "
+                    "WHERE id = ?",
+                    (FAILED, "Lease expired", now, job_id),
+                )
+
+            db.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, owner = ?, "
+                "lease_expires = ? WHERE id = ?",
+                (RUNNING, attempts + 1, owner, now + lease, job_id),
+            )
+
+        return Job(
+            job_id, kind, key, json.loads(payload), attempts + 1, max_attempts, owner
+        )
+
+    def heartbeat(self, job, lease):
+        with self.__transaction() as db:
+            return self.__update(db, job, "lease_expires = ?", (self.clock() + lease,))
+
+    def complete(self, job, result):
+        with self.__transaction() as db:
+            return self.__update(
+                db,
+                job,
+                "state = ?, result = ?, error = NULL, lease_expires = NULL, "
+                "finished_at = ?",
+                (DONE, json.dumps(result), self.clock()),
+            )
+
+    def fail(self, job, error, retry_delay):
+        with self.__transaction() as db:
+            if job.attempts < job.max_attempts:
+                return self.__update(
+                    db,
+                    job,
+                    "state = ?, error = ?, available_at = ?, lease_expires = NULL",
+                    (PENDING, str(error), self.clock() + retry_delay),
+                )
+
+            return self.__update(
+                db,
+                job,
+                "state = ?, error = ?, lease_expires = NULL, finished_at = ?",
+                (FAILED, str(error), self.clock()),
+            )
+
+    @staticmethod
+    def __update(db, job, assignments, values):
+        # Only the current lease holder may update a job
+        return (
+            db.execute(
+                "UPDATE jobs SET {} WHERE id = ? AND state = ? AND owner = ? "
+                "AND attempts = ?".format(assignments),
+                values + (job.id, RUNNING, job.owner, job.attempts),
+            ).rowcount
+            == 1
+        )
+
+    def result(self, key):
+        row = (
+            self.__connection()
+            .execute("SELECT result FROM jobs WHERE key = ? AND state = ?", (key, DONE))
+            .fetchone()
+        )
+        return None if row is None else json.loads(row[0])
+
+    def counts(self):
+        return dict(
+            self.__connection()
+            .execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            .fetchall()
+        )
+
+
+class _Transaction:
+    """
+    Runs a block in an IMMEDIATE transaction, which takes the database's
+    write lock up front so that concurrent claims can't interleave
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.db.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+
+
+class Worker:
+    """
+    Claims jobs from a Broker and runs them with the handler for their
+    kind. Run as many workers as needed, in threads, processes or on
+    other machines, to scale out
+    """
+
+    def __init__(
+        self, broker, handlers, owner=None, lease=60, retry_delay=5, poll_interval=1
+    ):
+        """
+        :param broker: The Broker to claim jobs from
+        :param handlers: A dictionary of job kind to a function called
+        with the job's payload, which returns its JSON serialisable
+        result
+        :param owner: An identifier for the worker, by default unique to
+        the worker
+        :param lease: The number of seconds a job is leased for. The
+        lease is renewed about every lease / 3 seconds while the job runs
+        :param retry_delay: The number of seconds before a failed job is
+        first retried, doubling with each attempt
+        :param poll_interval: The number of seconds to wait when there
+        are no jobs
+        """
+        self.broker = broker
+        self.handlers = handlers
+        self.owner = owner or "{}:{}:{}".format(
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8]
+        )
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger("pycate")
+
+    def run_once(self):
+        """
+        Claims and runs one job
+        :return: False if there were no jobs available
+        """
+        job = self.broker.claim(self.owner, self.lease)
+        if job is None:
+            return False
+
+        self.logger.debug("{} running {}".format(self.owner, job))
+
+        heartbeat = _Heartbeat(self.broker, job, self.lease)
+        heartbeat.start()
+        try:
+            result = self.handlers[job.kind](job.payload)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        finally:
+            heartbeat.stop()
+
+        if heartbeat.lost:
+            # Another worker has claimed the job, so its result is theirs
+            # to record
+            self.logger.warning("Lost the lease on {}".format(job))
+            return True
+
+        if error is not None:
+            self.logger.warning("{} failed: {!r}".format(job, error))
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            if not self.broker.fail(job, repr(error), delay):
+                self.logger.warning("Lost the lease on {}".format(job))
+            return True
+
+        if not self.broker.complete(job, result):
+            self.logger.warning("Lost the lease on {}".format(job))
+
+        return True
+
+    def run(self, stop=None, exit_when_idle=False):
+        """
+        Runs jobs until stop is set
+        :param stop: A threading.Event which stops the worker when set
+        :param exit_when_idle: If True, return as soon as there are no
+        jobs available
+        """
+        try:
+            while stop is None or not stop.is_set():
+                if self.run_once():
+                    continue
+                if exit_when_idle:
+                    return
+                time.sleep(self.poll_interval)
+        finally:
+            self.broker.close()
+
+
+class _Heartbeat(threading.Thread):
+    """
+    Renews the lease on a job while it runs, until it is stopped or the
+    lease is lost
+    """
+
+    def __init__(self, broker, job, lease):
+        super().__init__(daemon=True)
+        self.broker = broker
+        self.job = job
+        self.lease = lease
+        self.lost = False
+        self.__stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.__stopped.wait(self.lease / 3):
+                if not self.broker.heartbeat(self.job, self.lease):
+                    self.lost = True
+                    return
+        finally:
+            self.broker.close()
+
+    def stop(self):
+        self.__stopped.set()
+        self.join()
+
+
+def cate_handlers(get_cate, broker, download_dir=None, refresh_interval=300):
+    """
+    Creates the handlers for the timetable, notes and download jobs. A
+    timetable job queues notes jobs for its modules, and if download_dir
+    is given a notes job queues download jobs for its files, all of which
+    are deduplicated by the broker. Giving the CATe instances a cache
+    avoids fetching a timetable twice for its modules and exercises
+    :param get_cate: A function returning the authenticated CATe
+    instance to use for a user (the user is None for jobs which weren't
+    queued on behalf of anyone)
+    :param broker: The Broker to queue follow-up jobs on
+    :param download_dir: The directory to download notes files to
+    :param refresh_interval: Follow-up jobs which finished less than
+    this many seconds ago aren't queued again, so a notes page shared by
+    many users is only fetched once per scrape
+    :return: A dictionary of handlers to give to a Worker
+    """
+
+    def timetable(payload):
+        cate = get_cate(payload["user"])
+        period, clazz = cate.get_default_period_and_class(
+            payload["period"], payload["class"]
+        )
+
+        modules = cate.get_modules(period, clazz)
+        for module in modules:
+            if "notes_key" in module:
+                broker.put(
+                    *notes_job(module["notes_key"], payload["user"]),
+                    requeue_after=refresh_interval
+                )
+
+        return {
+            "period": period,
+            "class": clazz,
+            "modules": modules,
+            "exercises": [
+                exercise.to_dict()
+                for exercise in cate.get_exercise_timetable(period, clazz)
+            ],
+        }
+
+    def notes(payload):
+        notes = get_cate(payload["user"]).get_notes(payload["notes_key"])
+
+        if download_dir is not None:
+            for note in notes:
+                if "filekey" in note:
+                    filename = re.sub(r"[^\w.-]", "_", note["filekey"])
+                    path = os.path.join(download_dir, filename)
+                    broker.put(
+                        *download_job(note["filekey"], path, payload["user"]),
+                        requeue_after=refresh_interval
+                    )
+
+        return notes
+
+    def download(payload):
+        cate = get_cate(payload["user"])
+        return cate.download_file(payload["filekey"], payload["path"])
+
+    return {TIMETABLE: timetable, NOTES: notes, DOWNLOAD: download}
@@ -0,0 +1,425 @@
+"""
+Provides a mock CATe server generating synthetic personal, timetable and
+notes pages in the structure CATe serves them, for testing and load
+testing code using pycate without network access:
+
+    with MockCATeServer(modules=20, exercises=10, notes=30) as server:
+        cate = CATe("load test", http=Http("load test", server.base_url))
+        cate.authenticate("user", "password")
+        cate.get_exercise_timetable()
+
+It can also simulate latency, Basic authentication failures and
+throttling.
+"""
+
+import base64
+import calendar
+import datetime
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from pycate.util import get_current_academic_year
+
+_ASSESSED_COLOURS = ["#ccffcc", "#f0ccf0", "white", "#cdcdcd"]
+_SUBMISSION_STYLES = [
+    "border: 2px solid red",
+    None,
+    "border: 5px solid red",
+    "border: 2px solid yellow",
+    None,
+    "border: 5px solid yellow",
+]
+
+_PERSONAL = """<!DOCTYPE html>
+<html>
+<head>
+<title>CATe - {login}</title>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+</head>
+<body>
+<form method="post" action="/personal.cgi?keyp={year}:{login}"><table>
+<tr>
+<td><h2>Personal Page</h2></td>
+<td><table>
+<tr><td rowspan=6></td><td colspan="3"><b>{name}</b></td></tr>
+<tr><td> Login: <b>{login}</b></td><td></td><td> CID: <b>{cid}</b></td></tr>
+<tr><td> Status: <b>{status}</b></td><td></td><td> Department: <b>{department}</b></td></tr>
+<tr><td colspan="3"> Category: <b>{category}</b></td></tr>
+<tr><td colspan="3"> Email: <b>{email}</b></td></tr>
+<tr><td colspan="3"> Personal Tutor: <b>{tutor_name}<br>({tutor_login})</b></td></tr>
+</table></td>
+</tr></form>
+
+<tr>
+<td><form method="get" action="timetable.cgi"><table>
+<tr><td><table><tr><td><table><tr><td><table border="1">
+{periods}
+</table></td></tr></table></td></tr></table></td>
+<td><table border="1">
+{classes}
+</table></td></tr>
+</table></form></td>
+</tr>
+</table>
+</body>
+</html>
+"""
+
+_NOTES = """<!DOCTYPE html>
+<html>
+<head>
+<title>CATe - Notes</title>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+</head>
+<body>
+<form method="post" action="/notes.cgi?key={key}">
+<table>
+<tr><td><table>
+<tr><th>No.</th><th>Title</th><th>Type</th><th>Size</th><th>Loaded</th><th>Owner</th><th>Hits</th></tr>
+{rows}
+<tr><td colspan="7">{count} notes</td></tr>
+</table></td></tr>
+</table>
+</form>
+</body>
+</html>
+"""
+
+
+class MockCATeServer(ThreadingMixIn, HTTPServer):
+    """
+    A threaded HTTP server imitating CATe. Every page is generated from
+    the server's parameters, so the same parameters always give the same
+    pages. Handing in an exercise marks it as submitted.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        modules=5,
+        exercises=4,
+        notes=5,
+        period_days=77,
+        file_size=1024,
+        latency=0,
+        username=None,
+        password=None,
+        rate_limit=None,
+        period="1",
+        clazz="c1",
+    ):
+        """
+        :param address: A (host, port) tuple to listen on, by default a
+        free port on localhost
+        :param modules: The number of modules on the timetable
+        :param exercises: The number of exercises of each module
+        :param notes: The number of notes of each module
+        :param period_days: The number of days the timetable covers
+        :param file_size: The size in bytes of files served by showfile
+        :param latency: The number of seconds to wait before responding,
+        or a function returning it
+        :param username: If not None, the only username accepted
+        :param password: If not None, the only password accepted
+        :param rate_limit: If not None, the number of requests a second
+        served before responding 429 Too Many Requests
+        :param period: The default period of the user
+        :param clazz: The default class of the user
+        """
+        super().__init__(address, _Handler)
+        self.modules = modules
+        self.exercises = exercises
+        self.notes = notes
+        self.period_days = period_days
+        self.file_size = file_size
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.rate_limit = rate_limit
+        self.period = period
+        self.clazz = clazz
+
+        # Counts of the requests received for each page
+        self.requests = Counter()
+        self.submitted = set()
+        self.__lock = threading.Lock()
+        self.__tokens = rate_limit
+        self.__refilled = time.monotonic()
+        self.__thread = None
+
+    @property
+    def base_url(self):
+        """The URL to give Http as its base_url"""
+        return "http://{}:{}/".format(*self.server_address[:2])
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        """
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def record(self, page):
+        """
+        Counts a request for a page, returning False if it should be
+        throttled
+        """
+        with self.__lock:
+            self.requests[page] += 1
+
+            if self.rate_limit is None:
+                return True
+
+            now = time.monotonic()
+            self.__tokens = min(
+                self.rate_limit,
+                self.__tokens + (now - self.__refilled) * self.rate_limit,
+            )
+            self.__refilled = now
+
+            if self.__tokens < 1:
+                self.requests["throttled"] += 1
+                return False
+
+            self.__tokens -= 1
+            return True
+
+    def check_credentials(self, username, password):
+        return (self.username is None or username == self.username) and (
+            self.password is None or password == self.password
+        )
+
+    def submit(self, key):
+        with self.__lock:
+            self.submitted.add(key)
+
+    def personal_page(self, login):
+        periods = "\n".join(
+            '<tr><td><input type=radio name=period value="{p}"{checked}></td>'
+            "<td>Period {p}</td></tr>".format(
+                p=p, checked=" checked" if str(p) == self.period else ""
+            )
+            for p in range(1, 8)
+        )
+        classes = "\n".join(
+            '<tr><td><input type=radio name=class value="{c}"{checked}></td>'
+            "<td>{c}</td></tr>".format(
+                c=c, checked=" checked" if c == self.clazz else ""
+            )
+            for c in ["c1", "c2", "c3", "c4", "j1", "j2", "j3", "j4"]
+        )
+
+        return _PERSONAL.format(
+            year=get_current_academic_year()[0],
+            login=login,
+            name="Test User {}".format(login),
+            cid="0{:07d}".format(sum(map(ord, login))),
+            status="Student",
+            department="Computing",
+            category="Undergraduate",
+            email="{}@imperial.ac.uk".format(login),
+            tutor_name="Personal Tutor",
+            tutor_login="tutor",
+            periods=periods,
+            classes=classes,
+        )
+
+    def timetable_page(self, period, clazz, login):
+        year = get_current_academic_year()[0]
+        start = datetime.date(year, 10, 5)
+        days = [start + datetime.timedelta(days=i) for i in range(self.period_days)]
+
+        months = list()
+        for day in days:
+            if months and months[-1][0] == day.month:
+                months[-1][1] += 1
+            else:
+                months.append([day.month, 1])
+
+        rows = [
+            "<tr><th></th>{}</tr>".format(
+                "".join(
+                    '<th colspan="{}">{}</th>'.format(colspan, calendar.month_name[m])
+                    for m, colspan in months
+                )
+            ),
+            '<tr><th></th><th colspan="{}">Week</th></tr>'.format(len(days)),
+            "<tr><th></th>{}</tr>".format(
+                "".join("<th>{}</th>".format(day.day) for day in days)
+            ),
+        ]
+        rows += ['<tr><td colspan="{}"></td></tr>'.format(len(days) + 1)] * 4
+
+        for m in range(self.modules):
+            number = 100 + m
+            notes_key = "{}:{}:1:{}:new:{}".format(year, number, clazz, login)
+
+            for e in range(self.exercises):
+                cells = ["<td></td>"]
+                if e == 0:
+                    cells.append(
+                        '<td rowspan="{}" style="border: 2px solid blue">'
+                        '<a href="notes.cgi?key={}">{} - Module {}</a></td>'
+                        "<td></td><td></td>".format(
+                            self.exercises, notes_key, number, number
+                        )
+                    )
+
+                length = min(5, len(days))
+                offset = (m * 3 + e * 7) % (len(days) - length + 1)
+                exercise_key = "{}:{}:{}:{}:{}".format(year, period, number, e, clazz)
+
+                if offset > 0:
+                    cells.append('<td colspan="{}"></td>'.format(offset))
+                cells.append(self.__exercise_cell(exercise_key, login, m, e, length))
+                if len(days) - offset - length > 0:
+                    cells.append(
+                        '<td colspan="{}"></td>'.format(len(days) - offset - length)
+                    )
+
+                rows.append("<tr>{}</tr>".format("".join(cells)))
+
+        return (
+            "<!DOCTYPE html>\n<html>\n<head>\n<title>CATe - Timetable</title>\n"
+            '<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />'
+            "\n</head>\n<body>\n<h2>Timetable - {}</h2>\n"
+            "<table>\n{}\n</table>\n</body>\n</html>\n".format(login, "\n".join(rows))
+        )
+
+    def __exercise_cell(self, key, login, m, e, length):
+        handin_key = "{}:new:{}".format(key, login)
+        style = _SUBMISSION_STYLES[(m + e) % len(_SUBMISSION_STYLES)]
+        if handin_key in self.submitted:
+            style = None
+
+        return (
+            '<td colspan="{}" bgcolor="{}"{}><span title="Exercise {}">{}:CW</span> '
+            '<a href="showfile.cgi?key={}:SPECS:{}">Spec</a> '
+            '<a href="handins.cgi?key={}">Handin</a> '
+            '<a href="given.cgi?key={}:new:{}">Givens</a></td>'.format(
+                length,
+                _ASSESSED_COLOURS[(m + e) % len(_ASSESSED_COLOURS)],
+                "" if style is None else ' style="{}"'.format(style),
+                e + 1,
+                e + 1,
+                key,
+                login,
+                handin_key,
+                key,
+                login,
+            )
+        )
+
+    def notes_page(self, key):
+        rows = list()
+        for n in range(1, self.notes + 1):
+            if n % 5 == 0:
+                link = '<a href="#" title="https://www.doc.ic.ac.uk/{}">Link {}</a>'
+                link, note_type = link.format(n, n), "URL*"
+            else:
+                link = '<a href="showfile.cgi?key={}:NOTES:{}">Lecture {}</a>'
+                link, note_type = link.format(key, n, n), "pdf"
+
+            rows.append(
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}K</td>"
+                "<td>2017-10-{:02d}</td><td>lecturer</td><td>{}</td></tr>".format(
+                    n, link, note_type, n * 10, n % 28 + 1, n * 3
+                )
+            )
+
+        return _NOTES.format(key=key, rows="\n".join(rows), count=self.notes)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.__handle()
+
+    def do_POST(self):
+        self.__handle()
+
+    def __handle(self):
+        url = urlsplit(self.path)
+        page = url.path.lstrip("/") or "index"
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if "Content-Length" in self.headers:
+            self.rfile.read(int(self.headers["Content-Length"]))
+
+        latency = self.server.latency
+        latency = latency() if callable(latency) else latency
+        if latency:
+            time.sleep(latency)
+
+        if not self.server.record(page):
+            self.__respond(429, b"Too Many Requests", {"Retry-After": "1"})
+            return
+
+        username, password = self.__credentials()
+        if not self.server.check_credentials(username, password):
+            self.__respond(
+                401, b"Unauthorized", {"WWW-Authenticate": 'Basic realm="CATe"'}
+            )
+            return
+
+        if page == "index":
+            body = "<html><body>CATe</body></html>"
+        elif page == "personal.cgi":
+            body = self.server.personal_page(query["keyp"].split(":")[1] or username)
+        elif page == "timetable.cgi":
+            _, period, clazz, login = query["keyt"].split(":")
+            body = self.server.timetable_page(period, clazz, login or username)
+        elif page == "notes.cgi":
+            body = self.server.notes_page(query["key"])
+        elif page == "showfile.cgi":
+            self.__respond(200, b"x" * self.server.file_size, content_type=None)
+            return
+        elif page == "handins.cgi" and self.command == "POST":
+            self.server.submit(query["key"])
+            body = "<html><body>Submitted</body></html>"
+        else:
+            self.__respond(404, b"Not Found")
+            return
+
+        self.__respond(200, body.encode("utf-8"))
+
+    def __credentials(self):
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Basic "):
+            return None, None
+
+        decoded = base64.b64decode(authorization[6:]).decode("utf-8")
+        username, _, password = decoded.partition(":")
+        return username, password
+
+    def __respond(self, status, body, headers=None, content_type="text/html"):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type + "; charset=utf-8")
+        else:
+            self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
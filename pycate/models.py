@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Dict
+from typing import Dict, Optional
 
 
 class AssessedStatus(Enum):
@@ -24,6 +24,31 @@ class SubmissionStatus(Enum):
     INCOMPLETE_SUBMISSION_DUE_SOON = "I-S-DS"
 
 
+class Credentials:
+    """
+    The credentials a CATe instance makes requests with. Instances are
+    immutable, so they can be swapped in a single assignment and read
+    without locking
+    """
+
+    def __init__(self, username: str, password: str, authenticated: bool):
+        self.__username = username
+        self.__password = password
+        self.__authenticated = authenticated
+
+    @property
+    def username(self) -> str:
+        return self.__username
+
+    @property
+    def password(self) -> str:
+        return self.__password
+
+    @property
+    def authenticated(self) -> bool:
+        return self.__authenticated
+
+
 class UserInfo:
     def __init__(
         self,
@@ -48,6 +73,18 @@ class UserInfo:
     def __str__(self):
         return "UserInfo{{{}}}".format(self.__login)
 
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "name": self.__name,
+            "login": self.__login,
+            "cid": self.__cid,
+            "status": self.__status,
+            "department": self.__department,
+            "category": self.__category,
+            "email": self.__email,
+            "personal_tutor": self.__personal_tutor,
+        }
+
     @property
     def name(self) -> str:
         return self.__name
@@ -111,6 +148,20 @@ class Exercise:
             self.module_number, self.module_name, self.code, self.name
         )
 
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "module_number": self.__module_number,
+            "module_name": self.__module_name,
+            "code": self.__code,
+            "name": self.__name,
+            "start": self.__start,
+            "end": self.__end,
+            "assessed_status": self.__assessed_status.value,
+            "submission_status": self.__submission_status.value,
+            "links": dict(self.__links),
+            "spec_key": self.__spec_key,
+        }
+
     @property
     def module_number(self) -> str:
         return self.__module_number
@@ -150,3 +201,97 @@ class Exercise:
     @property
     def spec_key(self) -> str:
         return self.__spec_key
+
+
+class HandinResult:
+    def __init__(
+        self,
+        exercise: Exercise,
+        status_code: int,
+        bytes_sent: int,
+        submission_status: SubmissionStatus,
+        error: Optional[Exception] = None,
+    ):
+        self.__exercise = exercise
+        self.__status_code = status_code
+        self.__bytes_sent = bytes_sent
+        self.__submission_status = submission_status
+        self.__error = error
+
+    def __str__(self):
+        return "HandinResult{{Exercise={};Status={}}}".format(
+            self.exercise, self.submission_status.value
+        )
+
+    @property
+    def exercise(self) -> Exercise:
+        return self.__exercise
+
+    @property
+    def status_code(self) -> Optional[int]:
+        """
+        The status code CATe responded with, or None if the upload failed
+        before getting a response
+        """
+        return self.__status_code
+
+    @property
+    def bytes_sent(self) -> int:
+        return self.__bytes_sent
+
+    @property
+    def submission_status(self) -> SubmissionStatus:
+        """
+        The submission status of the exercise as re-read from the
+        timetable after the upload, or UNKNOWN if it wasn't verified
+        """
+        return self.__submission_status
+
+    @property
+    def error(self) -> Optional[Exception]:
+        """
+        The exception which stopped the upload, or None
+        """
+        return self.__error
+
+    @property
+    def accepted(self) -> bool:
+        return self.__status_code is not None and 200 <= self.__status_code < 300
+
+    @property
+    def verified(self) -> bool:
+        return self.accepted and self.__submission_status is SubmissionStatus.OK
+
+
+class PageStats:
+    def __init__(
+        self, url: str, wire_bytes: int, content_bytes: int, parse_seconds: float
+    ):
+        self.__url = url
+        self.__wire_bytes = wire_bytes
+        self.__content_bytes = content_bytes
+        self.__parse_seconds = parse_seconds
+
+    def __str__(self):
+        return "PageStats{{{} bytes on the wire;{} bytes;{:.1f}ms to parse}}".format(
+            self.wire_bytes, self.content_bytes, self.parse_seconds * 1000
+        )
+
+    @property
+    def url(self) -> str:
+        return self.__url
+
+    @property
+    def wire_bytes(self) -> int:
+        """The size of the (possibly compressed) response body"""
+        return self.__wire_bytes
+
+    @property
+    def content_bytes(self) -> int:
+        """The size of the decompressed response body"""
+        return self.__content_bytes
+
+    @property
+    def parse_seconds(self) -> float:
+        """The time taken to decode and parse the page"""
+        return self.__parse_seconds
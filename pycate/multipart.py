@@ -0,0 +1,137 @@
+"""
+Provides a streaming multipart/form-data encoder for uploads to CATe
+"""
+
+import mimetypes
+import os
+import uuid
+
+
+class MultipartEncoder:
+    """
+    A file-like multipart/form-data body which reads the files it
+    contains lazily, so that an upload never holds more than one chunk
+    of a file in memory. Instances can be passed directly as the body of
+    a request, which will then be sent with a Content-Length header
+    rather than chunked.
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None, callback=None):
+        """
+        :param fields: A dictionary of plain form fields to send
+        :param files: A list of (field name, path) tuples for the files
+        to upload
+        :param boundary: The boundary to use, by default a random one is
+        generated
+        :param callback: Called as callback(bytes_read, total) whenever a
+        chunk of the body is read
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.callback = callback
+        self.bytes_read = 0
+
+        # Each part is either bytes (headers and plain fields) or a path
+        # to a file which is only opened when it is reached
+        self.__parts = list()
+
+        for name, value in (fields or dict()).items():
+            self.__parts.append(
+                self.__part_header(name) + str(value).encode("utf-8") + b"\r\n"
+            )
+
+        for name, path in files or list():
+            filename = os.path.basename(path)
+            content_type = (
+                mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            )
+            self.__parts.append(self.__part_header(name, filename, content_type))
+            self.__parts.append(path)
+            self.__parts.append(b"\r\n")
+
+        self.__parts.append("--{}--\r\n".format(self.boundary).encode("utf-8"))
+
+        self.len = sum(
+            len(part) if isinstance(part, bytes) else os.path.getsize(part)
+            for part in self.__parts
+        )
+
+        self.__current = None
+        self.__index = 0
+
+    @property
+    def content_type(self):
+        return "multipart/form-data; boundary={}".format(self.boundary)
+
+    def __len__(self):
+        return self.len
+
+    def __part_header(self, name, filename=None, content_type=None):
+        disposition = 'form-data; name="{}"'.format(name)
+        if filename is not None:
+            disposition += '; filename="{}"'.format(filename)
+
+        header = "--{}\r\nContent-Disposition: {}\r\n".format(
+            self.boundary, disposition
+        )
+        if content_type is not None:
+            header += "Content-Type: {}\r\n".format(content_type)
+
+        return (header + "\r\n").encode("utf-8")
+
+    def read(self, size=-1):
+        """
+        Reads up to size bytes of the encoded body, or the rest of it if
+        size is negative
+        """
+        chunks = list()
+        remaining = size
+
+        while remaining != 0 and self.__index < len(self.__parts):
+            if self.__current is None:
+                part = self.__parts[self.__index]
+                if isinstance(part, bytes):
+                    self.__current = _BytesReader(part)
+                else:
+                    self.__current = open(part, "rb")
+
+            chunk = self.__current.read(remaining)
+
+            if not chunk:
+                self.__current.close()
+                self.__current = None
+                self.__index += 1
+                continue
+
+            chunks.append(chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+
+        data = b"".join(chunks)
+        self.bytes_read += len(data)
+
+        if data and self.callback is not None:
+            self.callback(self.bytes_read, self.len)
+
+        return data
+
+    def close(self):
+        if self.__current is not None:
+            self.__current.close()
+            self.__current = None
+
+
+class _BytesReader:
+    def __init__(self, data):
+        self.__data = data
+        self.__offset = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self.__data) - self.__offset
+
+        chunk = self.__data[self.__offset : self.__offset + size]
+        self.__offset += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
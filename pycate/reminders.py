@@ -0,0 +1,194 @@
+"""
+Provides a scheduler firing reminders ahead of exercise deadlines
+"""
+
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+
+from pycate.models import SubmissionStatus
+
+
+class Reminder:
+    def __init__(self, user, exercise, lead_time, due):
+        self.user = user
+        self.exercise = exercise
+        self.lead_time = lead_time
+        self.due = due
+
+    def __str__(self):
+        return "Reminder{{{};{};Due={}}}".format(
+            self.user, self.exercise, self.due.strftime("%Y-%m-%d %H:%M")
+        )
+
+
+class ReminderScheduler:
+    """
+    Keeps reminders for exercises in a priority queue ordered by when
+    they are due, so that each tick only looks at the reminders which
+    are due rather than every exercise of every user.
+
+    Exercises are identified by (user, module number, exercise code), so
+    ingesting a newer timetable updates exercises in place. Once an
+    exercise's submission status is OK its pending reminders are
+    cancelled, and they are rescheduled if it changes back. Reminders
+    which are already due when an exercise is ingested are skipped, so
+    old exercises don't send reminders for deadlines long past.
+    """
+
+    def __init__(self, lead_times, callback, deadline_time=datetime.time(23, 59)):
+        """
+        :param lead_times: A list of timedeltas before a deadline at
+        which to remind the user, e.g. [timedelta(days=1)]. Duplicates
+        are ignored
+        :param callback: Called with each Reminder as it fires
+        :param deadline_time: The time of day on an exercise's end date
+        that it is due
+        """
+        self.lead_times = sorted(set(lead_times), reverse=True)
+        self.callback = callback
+        self.deadline_time = deadline_time
+
+        self.__heap = list()
+        # The current version of each exercise. Heap entries for older
+        # versions are skipped when they are popped
+        self.__versions = dict()
+        self.__state = dict()
+        # The number of reminders still to fire for the current version
+        # of each exercise
+        self.__live = dict()
+        self.__live_total = 0
+        self.__counter = itertools.count()
+        self.__lock = threading.Lock()
+        self.logger = logging.getLogger("pycate")
+
+    def ingest(self, user, exercises, now=None):
+        """
+        Adds or updates the reminders for a user's exercises
+        :param user: The user the exercises belong to
+        :param exercises: Exercises, e.g. from get_exercise_timetable
+        :param now: The current time, by default datetime.now(). Reminders
+        due by then are skipped
+        """
+        if now is None:
+            now = datetime.datetime.now()
+
+        with self.__lock:
+            for exercise in exercises:
+                self.__ingest(user, exercise, now)
+            self.__compact()
+
+    def __ingest(self, user, exercise, now):
+        key = (user, exercise.module_number, exercise.code)
+        state = (exercise.end, exercise.submission_status is SubmissionStatus.OK)
+
+        if self.__state.get(key) == state:
+            return
+
+        self.__state[key] = state
+        version = next(self.__counter)
+        self.__versions[key] = version
+        # Any queued reminders for the exercise are now stale
+        self.__live_total -= self.__live.pop(key, 0)
+
+        if state[1]:
+            return
+
+        deadline = datetime.datetime.combine(
+            datetime.datetime.strptime(exercise.end, "%Y-%m-%d").date(),
+            self.deadline_time,
+        )
+
+        for lead_time in self.lead_times:
+            due = deadline - lead_time
+            if due <= now:
+                continue
+
+            # The counter breaks ties so Reminders are never compared
+            heapq.heappush(
+                self.__heap,
+                (
+                    due,
+                    next(self.__counter),
+                    version,
+                    key,
+                    Reminder(user, exercise, lead_time, due),
+                ),
+            )
+            self.__live[key] = self.__live.get(key, 0) + 1
+            self.__live_total += 1
+
+    def remove(self, user, exercise):
+        """
+        Cancels the reminders for an exercise
+        """
+        with self.__lock:
+            key = (user, exercise.module_number, exercise.code)
+            self.__versions.pop(key, None)
+            self.__state.pop(key, None)
+            self.__live_total -= self.__live.pop(key, 0)
+            self.__compact()
+
+    def __compact(self):
+        # Rebuild the heap without cancelled reminders once they make up
+        # most of it, so toggling an exercise's status doesn't grow it
+        # without bound
+        if len(self.__heap) > 2 * self.__live_total + 64:
+            self.__heap = [
+                entry
+                for entry in self.__heap
+                if self.__versions.get(entry[3]) == entry[2]
+            ]
+            heapq.heapify(self.__heap)
+
+    def tick(self, now=None):
+        """
+        Fires the reminders which are due. Reminders which fell due more
+        than once since the last tick each fire. If the callback raises
+        for one reminder the error is logged and the rest still fire
+        :param now: The current time, by default datetime.now()
+        :return: The reminders which fired
+        """
+        if now is None:
+            now = datetime.datetime.now()
+
+        fired = list()
+        with self.__lock:
+            while self.__heap and self.__heap[0][0] <= now:
+                _, _, version, key, reminder = heapq.heappop(self.__heap)
+                if self.__versions.get(key) == version:
+                    fired.append(reminder)
+                    self.__live[key] -= 1
+                    self.__live_total -= 1
+                    if not self.__live[key]:
+                        del self.__live[key]
+
+        for reminder in fired:
+            try:
+                self.callback(reminder)
+            except Exception:
+                self.logger.exception("Failed to deliver {}".format(reminder))
+
+        return fired
+
+    def next_due(self):
+        """
+        :return: When the next reminder is due, or None if there are
+        none
+        """
+        with self.__lock:
+            # Drop cancelled reminders from the front of the queue
+            while (
+                self.__heap
+                and self.__versions.get(self.__heap[0][3]) != self.__heap[0][2]
+            ):
+                heapq.heappop(self.__heap)
+            return self.__heap[0][0] if self.__heap else None
+
+    def __len__(self):
+        """
+        :return: The number of reminders still to fire
+        """
+        return self.__live_total
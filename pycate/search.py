@@ -0,0 +1,279 @@
+"""
+Provides a full-text search index over module notes, stored on disk so
+it survives restarts
+"""
+
+import hashlib
+import math
+import re
+import sqlite3
+from collections import Counter
+
+# How much a match in each field of a note counts towards its score
+FIELD_WEIGHTS = {"title": 3, "module": 2, "owner": 1, "text": 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    notes_key TEXT NOT NULL,
+    number TEXT NOT NULL,
+    module TEXT NOT NULL,
+    title TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    type TEXT NOT NULL,
+    link TEXT,
+    text TEXT,
+    fingerprint TEXT NOT NULL,
+    length REAL NOT NULL,
+    UNIQUE (notes_key, number)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    note_id INTEGER NOT NULL,
+    tf REAL NOT NULL,
+    PRIMARY KEY (term, note_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_note ON postings (note_id);
+"""
+
+
+def tokenize(text):
+    """
+    Splits text into lower case terms
+    """
+    return re.findall(r"\w+", text.lower())
+
+
+class NotesIndex:
+    """
+    An inverted index over the notes returned by CATe.get_notes, ranked
+    with BM25. Notes are identified by their notes key and number, and
+    only notes which have changed since they were last indexed are
+    re-indexed.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        """
+        :param path: The path of the SQLite file to store the index in,
+        or ":memory:" to keep it in memory
+        :param k1: BM25 term frequency saturation parameter
+        :param b: BM25 length normalisation parameter
+        """
+        self.k1 = k1
+        self.b = b
+        self.__db = sqlite3.connect(path)
+        self.__db.executescript(_SCHEMA)
+
+    def close(self):
+        self.__db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.__db.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def update(self, cate, period=None, clazz=None, text_extractor=None):
+        """
+        Indexes the notes of every module in the given period/class
+        :param cate: The CATe instance to get modules and notes from
+        :param text_extractor: See update_module
+        :return: The number of notes which were (re-)indexed
+        """
+        indexed = 0
+        for module in cate.get_modules(period, clazz):
+            if "notes_key" not in module:
+                continue
+
+            notes = cate.get_notes(module["notes_key"])
+            indexed += self.update_module(
+                module["name"], module["notes_key"], notes, text_extractor
+            )
+
+        return indexed
+
+    def update_module(self, module, notes_key, notes, text_extractor=None):
+        """
+        Brings the index up to date with the notes of a module, adding
+        new and changed notes and removing ones which no longer exist
+        :param module: The name of the module, as given by get_modules
+        :param notes_key: The notes key the notes were fetched with
+        :param notes: The notes, as returned by get_notes
+        :param text_extractor: If not None, called with each note
+        dictionary and should return the text of the note's file (e.g.
+        from a downloaded copy) or None
+        :return: The number of notes which were (re-)indexed
+        """
+        existing = dict(
+            self.__db.execute(
+                "SELECT number, text FROM notes WHERE notes_key = ?", (notes_key,)
+            ).fetchall()
+        )
+
+        indexed = 0
+        with self.__db:
+            for note in notes:
+                text = existing.get(note["number"])
+                if text_extractor is not None:
+                    text = text_extractor(note) or text
+
+                if self.__index_note(module, notes_key, note, text):
+                    indexed += 1
+
+            numbers = {note["number"] for note in notes}
+            for number in existing:
+                if number not in numbers:
+                    self.__remove_note(notes_key, number)
+
+        return indexed
+
+    def add_text(self, notes_key, number, text):
+        """
+        Adds the text of a note's file (e.g. extracted from a downloaded
+        copy) to an already indexed note
+        :return: True if the note exists and was re-indexed
+        """
+        row = self.__db.execute(
+            "SELECT module, number, title, owner, type, link FROM notes "
+            "WHERE notes_key = ? AND number = ?",
+            (notes_key, number),
+        ).fetchone()
+        if row is None:
+            return False
+
+        module, number, title, owner, note_type, link = row
+        note = {"number": number, "title": title, "owner": owner, "type": note_type}
+        if link is not None:
+            note["url" if note_type == "URL" else "filekey"] = link
+
+        with self.__db:
+            return self.__index_note(module, notes_key, note, text)
+
+    def search(self, query, limit=10):
+        """
+        Searches the index
+        :param query: The terms to search for
+        :param limit: The maximum number of results to return
+        :return: A list of dictionaries describing the matching notes,
+        best match first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return list()
+
+        total, average_length = self.__db.execute(
+            "SELECT COUNT(*), AVG(length) FROM notes"
+        ).fetchone()
+        if total == 0:
+            return list()
+        average_length = average_length or 1
+
+        placeholders = ",".join("?" * len(terms))
+        postings = self.__db.execute(
+            "SELECT p.term, p.note_id, p.tf, n.length FROM postings p "
+            "JOIN notes n ON n.id = p.note_id "
+            "WHERE p.term IN ({})".format(placeholders),
+            tuple(terms),
+        ).fetchall()
+
+        frequencies = Counter(term for term, _, _, _ in postings)
+        scores = Counter()
+        for term, note_id, tf, length in postings:
+            df = frequencies[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            scores[note_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        results = list()
+        for note_id, score in scores.most_common(limit):
+            row = self.__db.execute(
+                "SELECT notes_key, number, module, title, owner, type, link "
+                "FROM notes WHERE id = ?",
+                (note_id,),
+            ).fetchone()
+            results.append(
+                {
+                    "notes_key": row[0],
+                    "number": row[1],
+                    "module": row[2],
+                    "title": row[3],
+                    "owner": row[4],
+                    "type": row[5],
+                    "link": row[6],
+                    "score": score,
+                }
+            )
+
+        return results
+
+    def __index_note(self, module, notes_key, note, text):
+        link = note.get("url", note.get("filekey"))
+        fields = {
+            "title": note["title"],
+            "module": module,
+            "owner": note["owner"],
+            "text": text or "",
+        }
+
+        fingerprint = hashlib.sha1(
+            "\0".join([note["type"], link or ""] + list(fields.values())).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+        row = self.__db.execute(
+            "SELECT id, fingerprint FROM notes WHERE notes_key = ? AND number = ?",
+            (notes_key, note["number"]),
+        ).fetchone()
+        if row is not None and row[1] == fingerprint:
+            return False
+
+        tfs = Counter()
+        for field, value in fields.items():
+            for term in tokenize(value):
+                tfs[term] += FIELD_WEIGHTS[field]
+
+        values = (
+            module,
+            note["title"],
+            note["owner"],
+            note["type"],
+            link,
+            text,
+            fingerprint,
+            sum(tfs.values()),
+        )
+
+        if row is None:
+            note_id = self.__db.execute(
+                "INSERT INTO notes (module, title, owner, type, link, text, "
+                "fingerprint, length, notes_key, number) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values + (notes_key, note["number"]),
+            ).lastrowid
+        else:
+            note_id = row[0]
+            self.__db.execute(
+                "UPDATE notes SET module = ?, title = ?, owner = ?, type = ?, "
+                "link = ?, text = ?, fingerprint = ?, length = ? WHERE id = ?",
+                values + (note_id,),
+            )
+            self.__db.execute("DELETE FROM postings WHERE note_id = ?", (note_id,))
+
+        self.__db.executemany(
+            "INSERT INTO postings (term, note_id, tf) VALUES (?, ?, ?)",
+            [(term, note_id, tf) for term, tf in tfs.items()],
+        )
+
+        return True
+
+    def __remove_note(self, notes_key, number):
+        row = self.__db.execute(
+            "SELECT id FROM notes WHERE notes_key = ? AND number = ?",
+            (notes_key, number),
+        ).fetchone()
+        self.__db.execute("DELETE FROM postings WHERE note_id = ?", (row[0],))
+        self.__db.execute("DELETE FROM notes WHERE id = ?", (row[0],))
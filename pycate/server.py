@@ -0,0 +1,139 @@
+"""
+Provides a read-through HTTP server which exposes a CATe instance as
+JSON endpoints, so several services can share one client and one cache
+instead of each scraping CATe themselves:
+
+    GET /user_info
+    GET /modules?period=<period>&class=<class>
+    GET /exercises?period=<period>&class=<class>
+    GET /notes?key=<notes key>
+
+The period and class parameters are optional and default to the user's
+current ones.
+"""
+
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from pycate.cache import Cache
+
+
+class CATeServer(ThreadingMixIn, HTTPServer):
+    """
+    A threaded HTTP server answering from a shared Cache. Responses are
+    cached already encoded, so a cache hit costs a dictionary lookup and
+    concurrent identical requests only make one request to CATe.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, cate, address=("127.0.0.1", 8080), ttl=300, stale_ttl=0, cache=None
+    ):
+        """
+        :param cate: The (authenticated) CATe instance to serve from
+        :param address: A (host, port) tuple to listen on
+        :param ttl: The number of seconds responses are cached for
+        :param stale_ttl: The number of seconds after a response expires
+        that it is still served while being refreshed in the background
+        :param cache: A Cache to use instead of creating a new one
+        """
+        super().__init__(address, _Handler)
+        self.cate = cate
+        self.cache = cache if cache is not None else Cache(ttl, stale_ttl)
+        self.logger = logging.getLogger("pycate")
+
+    def get(self, path, query):
+        """
+        Gets the encoded JSON response for an endpoint
+        :param path: The path of the endpoint, e.g. /modules
+        :param query: A dictionary of query parameters
+        :return: The response body, or None if there is no such endpoint
+        """
+        if path == "/user_info":
+            key = ("user_info",)
+            loader = lambda: self.cate.get_user_info().to_dict()
+        elif path == "/modules":
+            period, clazz = query.get("period"), query.get("class")
+            key = ("modules", period, clazz)
+            loader = lambda: self.cate.get_modules(period, clazz)
+        elif path == "/exercises":
+            period, clazz = query.get("period"), query.get("class")
+            key = ("exercises", period, clazz)
+            loader = lambda: [
+                exercise.to_dict()
+                for exercise in self.cate.get_exercise_timetable(period, clazz)
+            ]
+        elif path == "/notes" and query.get("key"):
+            notes_key = query["key"]
+            key = ("notes", notes_key)
+            loader = lambda: self.cate.get_notes(notes_key)
+        else:
+            return None
+
+        return self.cache.get(key, lambda: json.dumps(loader()).encode("utf-8"))
+
+    def load_snapshot(self, snapshot, ttl=None):
+        """
+        Seeds the cache with the responses a Snapshot can answer, so they
+        are served straight away instead of waiting for CATe
+        :param snapshot: The Snapshot to serve from
+        :param ttl: The number of seconds the seeded responses are fresh.
+        By default, if the cache has a stale_ttl they are stored already
+        expired, so they are served while fresh copies are scraped in the
+        background, and otherwise they are fresh for the cache's ttl
+        """
+        if ttl is None:
+            ttl = 0 if self.cache.stale_ttl > 0 else self.cache.ttl
+
+        def put(key, value):
+            self.cache.put(key, json.dumps(value).encode("utf-8"), ttl)
+
+        if snapshot.user_info is not None:
+            put(("user_info",), snapshot.user_info.to_dict())
+
+        keys = [(p, c, p, c) for p, c in snapshot.timetable_keys()]
+        if snapshot.default_period_and_class is not None:
+            keys.append((None, None) + tuple(snapshot.default_period_and_class))
+
+        for period, clazz, snapshot_period, snapshot_clazz in keys:
+            modules = snapshot.get_modules(snapshot_period, snapshot_clazz)
+            if modules is None:
+                continue
+            exercises = snapshot.get_exercise_timetable(snapshot_period, snapshot_clazz)
+            put(("modules", period, clazz), modules)
+            put(("exercises", period, clazz), [e.to_dict() for e in exercises])
+
+        for notes_key in snapshot.notes_keys():
+            put(("notes", notes_key), snapshot.get_notes(notes_key))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        try:
+            body = self.server.get(url.path, query)
+        except Exception as e:
+            self.server.logger.exception("Failed to fetch {}".format(self.path))
+            self.__respond(502, json.dumps({"error": str(e)}).encode("utf-8"))
+            return
+
+        if body is None:
+            self.__respond(404, b'{"error": "Not found"}')
+        else:
+            self.__respond(200, body)
+
+    def __respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
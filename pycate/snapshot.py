@@ -0,0 +1,506 @@
+"""
+Provides compact binary snapshots of scraped CATe data, so that a
+process can start serving the last data it saw straight away instead of
+scraping everything again first.
+
+A snapshot file is a fixed header followed by a payload:
+
+    header    magic, format version, creation time, the number of
+              strings, the size of the string data, the number of
+              record words and a CRC32 of the payload
+    offsets   (strings + 1) little-endian uint32 offsets into the
+              string data
+    records   little-endian uint32 words, each one a count or an index
+              into the string table
+    strings   the UTF-8 string data, each distinct string stored once
+
+Loading maps the file into memory and only decodes the exercises,
+modules or notes for a key the first time they are asked for.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from pycate.exceptions import SnapshotException
+from pycate.models import AssessedStatus, Exercise, SubmissionStatus, UserInfo
+
+MAGIC = b"PYCS"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHdIIII")
+_NONE = 0xFFFFFFFF
+
+_USER_INFO_FIELDS = (
+    "name",
+    "login",
+    "cid",
+    "status",
+    "department",
+    "category",
+    "email",
+    "personal_tutor",
+)
+
+
+class Snapshot:
+    """
+    The user info, default period and class, modules and exercises for
+    each period and class, and notes for each notes key known at one
+    point in time.
+
+    Snapshots returned by load() keep the file mapped until close() is
+    called, and decode each part of it lazily.
+    """
+
+    def __init__(
+        self,
+        user_info=None,
+        default_period_and_class=None,
+        timetables=None,
+        notes=None,
+        created=None,
+    ):
+        """
+        :param user_info: A UserInfo, or None
+        :param default_period_and_class: A (period, class) tuple, or None
+        :param timetables: A dictionary from (period, class) to a tuple
+        of the modules and exercises for that period and class, as
+        returned by get_modules and get_exercise_timetable
+        :param notes: A dictionary from notes key to notes, as returned
+        by get_notes
+        :param created: When the data was captured, by default now
+        """
+        self.__user_info = user_info
+        self.__default_period_and_class = default_period_and_class
+        self.__timetables = dict(timetables or {})
+        self.__notes = dict(notes or {})
+        self.__created = created if created is not None else time.time()
+
+        self.__reader = None
+
+    @classmethod
+    def capture(cls, cate, periods_and_classes=(), notes=True):
+        """
+        Scrapes a snapshot of the current user's data from CATe
+        :param cate: The authenticated CATe instance to scrape from
+        :param periods_and_classes: (period, class) tuples to capture as
+        well as the default one
+        :param notes: Whether to capture the notes of every module
+        :return: The Snapshot
+        """
+        user_info = cate.get_user_info()
+        default = cate.get_default_period_and_class()
+
+        timetables = dict()
+        for period, clazz in [default] + list(periods_and_classes):
+            if (period, clazz) in timetables:
+                continue
+            timetables[(period, clazz)] = (
+                cate.get_modules(period, clazz),
+                cate.get_exercise_timetable(period, clazz),
+            )
+
+        module_notes = dict()
+        if notes:
+            for modules, _ in timetables.values():
+                for module in modules:
+                    key = module.get("notes_key")
+                    if key and key not in module_notes:
+                        module_notes[key] = cate.get_notes(key)
+
+        return cls(user_info, default, timetables, module_notes)
+
+    @property
+    def user_info(self):
+        return self.__user_info
+
+    @property
+    def default_period_and_class(self):
+        return self.__default_period_and_class
+
+    @property
+    def created(self):
+        return self.__created
+
+    def timetable_keys(self):
+        """
+        :return: The (period, class) tuples the snapshot has timetables for
+        """
+        return list(self.__timetables)
+
+    def notes_keys(self):
+        """
+        :return: The notes keys the snapshot has notes for
+        """
+        return list(self.__notes)
+
+    def get_modules(self, period=None, clazz=None):
+        """
+        :return: The modules for the given period and class, which
+        default to the snapshot's default ones, or None if the snapshot
+        doesn't have them
+        """
+        timetable = self.__get_timetable(period, clazz)
+        return timetable[0] if timetable is not None else None
+
+    def get_exercise_timetable(self, period=None, clazz=None):
+        """
+        :return: The exercises for the given period and class, which
+        default to the snapshot's default ones, or None if the snapshot
+        doesn't have them
+        """
+        timetable = self.__get_timetable(period, clazz)
+        return timetable[1] if timetable is not None else None
+
+    def get_notes(self, notes_key):
+        """
+        :return: The notes for the given notes key, or None if the
+        snapshot doesn't have them
+        """
+        notes = self.__notes.get(notes_key)
+        if isinstance(notes, int):
+            notes = self.__notes[notes_key] = self.__reader.notes(notes)
+        return notes
+
+    def __get_timetable(self, period, clazz):
+        if self.__default_period_and_class is not None:
+            default_period, default_class = self.__default_period_and_class
+            period = default_period if period is None else period
+            clazz = default_class if clazz is None else clazz
+
+        timetable = self.__timetables.get((period, clazz))
+        if isinstance(timetable, int):
+            timetable = self.__reader.timetable(timetable)
+            self.__timetables[(period, clazz)] = timetable
+        return timetable
+
+    def save(self, path):
+        """
+        Writes the snapshot to a file. The file is replaced atomically,
+        so a process loading it never sees a partly written snapshot
+        """
+        writer = _Writer()
+        words = writer.words
+
+        if self.__user_info is None:
+            words.extend([_NONE] * len(_USER_INFO_FIELDS))
+        else:
+            user_info = self.__user_info.to_dict()
+            words.extend(writer.string(user_info[f]) for f in _USER_INFO_FIELDS)
+
+        words.extend(
+            map(writer.string, self.__default_period_and_class or (None, None))
+        )
+
+        timetable_keys = self.timetable_keys()
+        words.append(len(timetable_keys))
+        for period, clazz in timetable_keys:
+            modules, exercises = self.__get_timetable(period, clazz)
+            words.append(writer.string(period))
+            words.append(writer.string(clazz))
+            length = writer.reserve()
+            writer.dicts(modules)
+            words.append(len(exercises))
+            for exercise in exercises:
+                writer.exercise(exercise)
+            writer.fill(length)
+
+        notes_keys = self.notes_keys()
+        words.append(len(notes_keys))
+        for notes_key in notes_keys:
+            words.append(writer.string(notes_key))
+            length = writer.reserve()
+            writer.dicts(self.get_notes(notes_key))
+            writer.fill(length)
+
+        partial_path = path + ".part"
+        with open(partial_path, "wb") as f:
+            writer.write(f, self.__created)
+        os.replace(partial_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Maps a snapshot file into memory. Only the header and the index
+        of what the snapshot contains are decoded straight away
+        :raises SnapshotException: If the file isn't a snapshot, was
+        written by an unsupported version or is corrupt
+        :return: The Snapshot
+        """
+        reader = _Reader(path)
+        try:
+            snapshot = cls(created=reader.created)
+            reader.index(snapshot)
+        except Exception:
+            reader.close()
+            raise
+
+        snapshot.__reader = reader
+        return snapshot
+
+    def _set(self, user_info, default_period_and_class, timetables, notes):
+        self.__user_info = user_info
+        self.__default_period_and_class = default_period_and_class
+        self.__timetables = timetables
+        self.__notes = notes
+
+    def close(self):
+        """
+        Decodes anything not yet read from the file and unmaps it
+        """
+        if self.__reader is None:
+            return
+
+        for period, clazz in self.timetable_keys():
+            self.__get_timetable(period, clazz)
+        for notes_key in self.notes_keys():
+            self.get_notes(notes_key)
+
+        self.__reader.close()
+        self.__reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Writer:
+    def __init__(self):
+        self.words = array("I")
+        self.__strings = dict()
+        self.__data = bytearray()
+        self.__offsets = array("I", [0])
+
+    def string(self, value):
+        if value is None:
+            return _NONE
+
+        index = self.__strings.get(value)
+        if index is None:
+            index = self.__strings[value] = len(self.__offsets) - 1
+            self.__data += value.encode("utf-8")
+            self.__offsets.append(len(self.__data))
+        return index
+
+    def reserve(self):
+        # Leaves space for the number of words a section takes up, so
+        # loading can skip over it
+        self.words.append(0)
+        return len(self.words)
+
+    def fill(self, start):
+        self.words[start - 1] = len(self.words) - start
+
+    def dicts(self, values):
+        self.words.append(len(values))
+        for value in values:
+            self.dict(value)
+
+    def dict(self, value):
+        self.words.append(len(value))
+        for k, v in value.items():
+            self.words.append(self.string(k))
+            self.words.append(self.string(str(v)))
+
+    def exercise(self, exercise):
+        self.words.extend(
+            map(
+                self.string,
+                (
+                    exercise.module_number,
+                    exercise.module_name,
+                    exercise.code,
+                    exercise.name,
+                    exercise.start,
+                    exercise.end,
+                    exercise.assessed_status.value,
+                    exercise.submission_status.value,
+                    exercise.spec_key,
+                ),
+            )
+        )
+        self.dict(exercise.links)
+
+    def write(self, f, created):
+        offsets, words = self.__offsets, self.words
+        if sys.byteorder == "big":
+            offsets, words = array("I", offsets), array("I", words)
+            offsets.byteswap()
+            words.byteswap()
+
+        payload = offsets.tobytes() + words.tobytes() + bytes(self.__data)
+        f.write(
+            _HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                0,
+                created,
+                len(self.__offsets) - 1,
+                len(self.__data),
+                len(self.words),
+                zlib.crc32(payload),
+            )
+        )
+        f.write(payload)
+
+
+class _Reader:
+    def __init__(self, path):
+        self.__offsets = self.__records = None
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise SnapshotException("{} is too short to be a snapshot".format(path))
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.__open(path, size)
+        except Exception:
+            self.close()
+            raise
+
+    def __open(self, path, size):
+        magic, version, _, created, strings, data_size, words, crc = _HEADER.unpack(
+            self.__map[: _HEADER.size]
+        )
+
+        if magic != MAGIC:
+            raise SnapshotException("{} is not a snapshot".format(path))
+        if version != FORMAT_VERSION:
+            raise SnapshotException(
+                "{} has unsupported format version {}".format(path, version)
+            )
+
+        offsets_start = _HEADER.size
+        words_start = offsets_start + 4 * (strings + 1)
+        self.__data_start = words_start + 4 * words
+        if self.__data_start + data_size != size:
+            raise SnapshotException("{} is truncated".format(path))
+
+        view = memoryview(self.__map)
+        try:
+            if zlib.crc32(view[offsets_start:]) != crc:
+                raise SnapshotException("{} is corrupt".format(path))
+        finally:
+            view.release()
+
+        self.created = created
+        self.__offsets = self.__words(offsets_start, words_start)
+        self.__records = self.__words(words_start, self.__data_start)
+        self.__strings = dict()
+
+    def __words(self, start, end):
+        if sys.byteorder == "big":
+            words = array("I", self.__map[start:end])
+            words.byteswap()
+            return words
+        return memoryview(self.__map)[start:end].cast("I")
+
+    def string(self, index):
+        if index == _NONE:
+            return None
+
+        value = self.__strings.get(index)
+        if value is None:
+            start = self.__data_start + self.__offsets[index]
+            end = self.__data_start + self.__offsets[index + 1]
+            value = self.__strings[index] = sys.intern(
+                self.__map[start:end].decode("utf-8")
+            )
+        return value
+
+    def index(self, snapshot):
+        """
+        Reads the user info and default period and class, and finds
+        where each timetable and set of notes starts
+        """
+        try:
+            self.__index(snapshot)
+        except (IndexError, UnicodeDecodeError) as e:
+            raise SnapshotException("Snapshot is inconsistent: {}".format(e))
+
+    def __index(self, snapshot):
+        records, string = self.__records, self.string
+        fields = len(_USER_INFO_FIELDS)
+
+        user_info = None
+        if records[0] != _NONE:
+            user_info = UserInfo(*(string(records[i]) for i in range(fields)))
+
+        default = (string(records[fields]), string(records[fields + 1]))
+        if default == (None, None):
+            default = None
+
+        i = fields + 2
+        timetables = dict()
+        count, i = records[i], i + 1
+        for _ in range(count):
+            key = (string(records[i]), string(records[i + 1]))
+            timetables[key] = i + 3
+            i += 3 + records[i + 2]
+
+        notes = dict()
+        count, i = records[i], i + 1
+        for _ in range(count):
+            notes[string(records[i])] = i + 2
+            i += 2 + records[i + 1]
+
+        if i != len(records):
+            raise SnapshotException("Snapshot has trailing records")
+
+        snapshot._set(user_info, default, timetables, notes)
+
+    def timetable(self, i):
+        modules, i = self.__dicts(i)
+        exercises = list()
+        count, i = self.__records[i], i + 1
+        for _ in range(count):
+            exercise, i = self.__exercise(i)
+            exercises.append(exercise)
+        return modules, exercises
+
+    def notes(self, i):
+        return self.__dicts(i)[0]
+
+    def __dicts(self, i):
+        values = list()
+        count, i = self.__records[i], i + 1
+        for _ in range(count):
+            value, i = self.__dict(i)
+            values.append(value)
+        return values, i
+
+    def __dict(self, i):
+        records, string = self.__records, self.string
+        value = dict()
+        count, i = records[i], i + 1
+        for j in range(i, i + 2 * count, 2):
+            value[string(records[j])] = string(records[j + 1])
+        return value, i + 2 * count
+
+    def __exercise(self, i):
+        fields = [self.string(w) for w in self.__records[i : i + 9]]
+        links, i = self.__dict(i + 9)
+        exercise = Exercise(
+            *fields[:6],
+            AssessedStatus(fields[6]),
+            SubmissionStatus(fields[7]),
+            links,
+            fields[8],
+        )
+        return exercise, i
+
+    def close(self):
+        # The views have to be released before the map can be closed
+        for words in (self.__offsets, self.__records):
+            if isinstance(words, memoryview):
+                words.release()
+        self.__offsets = self.__records = None
+        self.__map.close()
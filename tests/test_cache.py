@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from pycate.cache import Cache
+
+
+class TestCache:
+    def test_expiry(self):
+        now = [0]
+        cache = Cache(ttl=10, clock=lambda: now[0])
+
+        assert cache.get('key', lambda: 1) == 1
+        assert cache.get('key', lambda: 2) == 1
+        now[0] = 11
+        assert cache.get('key', lambda: 2) == 2
+
+    def test_concurrent_loads_are_coalesced(self):
+        cache = Cache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache.get('key', loader)))
+            for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ['value'] * 10
+
+    def test_errors_are_not_cached(self):
+        cache = Cache()
+
+        def loader():
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            cache.get('key', loader)
+        assert 'key' not in cache
+        assert cache.get('key', lambda: 1) == 1
+
+    def test_stale_while_revalidate(self):
+        now = [0]
+        cache = Cache(ttl=10, stale_ttl=100, clock=lambda: now[0])
+        calls = []
+
+        def loader(value):
+            def load():
+                calls.append(value)
+                time.sleep(0.05)
+                return value
+            return load
+
+        assert cache.get('key', loader(1)) == 1
+
+        # Stale values are served while a single refresh runs
+        now[0] = 20
+        assert cache.get('key', loader(2)) == 1
+        assert cache.get('key', loader(3)) == 1
+        cache.wait()
+        assert calls == [1, 2]
+        assert cache.get('key', loader(4)) == 2
+
+        # Values past their stale time are loaded synchronously
+        now[0] = 200
+        assert cache.get('key', loader(5)) == 5
+        cache.close()
+
+    def test_prefetch(self):
+        cache = Cache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        assert cache.prefetch('key', loader)
+        assert not cache.prefetch('key', loader)
+        assert cache.get('key', loader) == 'value'
+        assert not cache.prefetch('key', loader)
+        assert len(calls) == 1
+        cache.close()
+
+    def test_invalidate_abandons_refresh_in_progress(self):
+        now = [0]
+        cache = Cache(ttl=10, stale_ttl=100, clock=lambda: now[0])
+        gate = threading.Event()
+
+        def slow_loader():
+            gate.wait(5)
+            return 'before'
+
+        assert cache.get('key', lambda: 'first') == 'first'
+        now[0] = 20
+        assert cache.get('key', slow_loader) == 'first'
+
+        cache.invalidate('key')
+        assert cache.get('key', lambda: 'after') == 'after'
+
+        gate.set()
+        cache.close()
+        assert cache.get('key', lambda: 'other') == 'after'
+
+    def test_expired_entries_are_swept(self):
+        now = [0]
+        cache = Cache(ttl=10, stale_ttl=10, clock=lambda: now[0])
+
+        for i in range(100):
+            cache.put(i, i)
+        now[0] = 30
+        for i in range(100, 200):
+            cache.put(i, i)
+
+        assert len(cache) <= 100
+        assert 150 in cache
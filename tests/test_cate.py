@@ -1,9 +1,20 @@
+import gc
+import os
+import sys
+import threading
+
 import pytest
 
+from pycate.cache import Cache
+from pycate.const import CATE_BASE_URL
 from pycate.http import Http
+from pycate.models import AssessedStatus, SubmissionStatus
 from pycate.urls import URLs
 from pycate.util import get_current_academic_year
 
+# Set PYCATE_SLOW_TESTS to check memory over thousands of scrapes
+MEMORY_ITERATIONS = 2000 if os.environ.get('PYCATE_SLOW_TESTS') else 300
+
 
 class TestCate:
     @pytest.fixture(name="cate")
@@ -25,14 +36,171 @@ class TestCate:
         assert info.personal_tutor == 'CATE_TEST_PT_NAME ' \
                                       '(CATE_TEST_PT_LOGIN)'
 
+    def test_default_period_and_class(self, cate):
+        assert cate.get_default_period_and_class() == ('4', 'c1')
+
+    def test_modules(self, cate):
+        modules = cate.get_modules()
+
+        assert modules == [
+            {'name': '113 - Architecture',
+             'notes_key': '2017:113:1:c1:new:CATE_TEST_LOGIN'},
+            {'name': '120.1 - Programming'},
+        ]
+
+    def test_exercise_timetable(self, cate):
+        exercises = cate.get_exercise_timetable()
+
+        assert [e.code for e in exercises] == ['1:CW', '2:TUT', '3:LAB']
+        assert exercises[0].name == 'Pipelining'
+        assert exercises[0].assessed_status is \
+            AssessedStatus.ASSESSED_INDIVIDUAL
+        assert exercises[0].submission_status is \
+            SubmissionStatus.NOT_SUBMITTED
+        assert exercises[0].spec_key == '2017:4:101:c1:SPECS:CATE_TEST_LOGIN'
+        assert exercises[1].submission_status is SubmissionStatus.OK
+        assert exercises[2].module_number == '120.1'
+        assert 'handin' in exercises[2].links
+
+    def test_page_stats(self, cate):
+        cate.get_modules()
+
+        stats = cate.page_stats['timetable']
+        assert stats.url == URLs.timetable(
+            get_current_academic_year()[0], '4', 'c1', '')
+        assert stats.wire_bytes == stats.content_bytes > 0
+        assert stats.parse_seconds > 0
+
+    def test_notes(self, cate):
+        notes = cate.get_notes('2017:113:1:c1:new:CATE_TEST_LOGIN')
+
+        assert [n['title'] for n in notes] == [
+            'Introduction to Pipelining', 'Caches and Memory Hierarchy',
+            'Course Website']
+        assert notes[0]['filekey'] == '2017:113:1:c1:NOTES:ab123'
+        assert notes[2]['type'] == 'URL'
+        assert notes[2]['url'] == 'https://www.doc.ic.ac.uk/~ab123/arch/'
+
+
+class TestCachedCate:
+    def test_prefetch_notes(self):
+        from pycate.cate import CATe
+        http = CountingHttp('tests')
+        cache = Cache(ttl=10, stale_ttl=100)
+        cate = CATe('tests', http=http, cache=cache, prefetch_notes=True)
+
+        cate.get_modules()
+        cache.wait()
+        notes_url = URLs.module_notes('2017:113:1:c1:new:CATE_TEST_LOGIN')
+        assert http.urls.count(notes_url) == 1
+
+        cate.get_notes('2017:113:1:c1:new:CATE_TEST_LOGIN')
+        cate.get_modules()
+        assert http.urls.count(notes_url) == 1
+        assert len(http.urls) == 3
+        cache.close()
+
+    def test_refresh_uses_credentials_it_was_queued_with(self):
+        from pycate.cate import CATe
+        http = UserRecordingHttp('tests')
+        now = [0]
+        cache = Cache(ttl=10, stale_ttl=100, max_workers=1,
+                      clock=lambda: now[0])
+        cate = CATe('tests', http=http, cache=cache)
+        notes_key = '2017:113:1:c1:new:CATE_TEST_LOGIN'
+
+        cate.authenticate('user1', 'password')
+        cate.get_notes(notes_key)
+
+        # Hold up the only worker so the refresh runs after the switch
+        gate = threading.Event()
+        cache.prefetch('block', lambda: gate.wait(5))
+        now[0] = 20
+        cate.get_notes(notes_key)
+        cate.authenticate('user2', 'password')
+        gate.set()
+        cache.close()
+
+        assert http.users[-1] == (URLs.module_notes(notes_key), 'user1')
+
+
+class TestBoundedMemory:
+    def test_memory_is_flat(self):
+        from pycate.cate import CATe
+        cate = CATe('tests', http=DummyHttp('tests'), bounded_memory=True)
+
+        # With automatic collection disabled only the cycles CATe
+        # collects itself are freed. Allocated blocks are counted rather
+        # than traced, as tracing would make thousands of scrapes slow
+        gc.collect()
+        gc.disable()
+        try:
+            # Peak allocated blocks of each of ten windows of iterations,
+            # each of which scrapes the timetable, modules and notes
+            peaks = []
+            for i in range(MEMORY_ITERATIONS):
+                if i % (MEMORY_ITERATIONS // 10) == 0:
+                    peaks.append(0)
+                cate.get_exercise_timetable('4', 'c1')
+                cate.get_modules('4', 'c1')
+                cate.get_notes('2017:113:1:c1:new:CATE_TEST_LOGIN')
+                peaks[-1] = max(peaks[-1], sys.getallocatedblocks())
+        finally:
+            gc.enable()
+
+        # The first window includes warming up
+        assert max(peaks[2:]) < peaks[1] * 1.02
+
+    def test_strings_are_interned(self):
+        from pycate.cate import CATe
+        cate = CATe('tests', http=DummyHttp('tests'), bounded_memory=True)
+
+        first = cate.get_exercise_timetable('4', 'c1')[0]
+        second = cate.get_exercise_timetable('4', 'c1')[0]
+        assert first.module_name is second.module_name
+        assert first.end is second.end
+
 
 class DummyResponse:
-    def __init__(self, text):
-        self.text = text
+    def __init__(self, content, headers=None):
+        self.status_code = 200
+        self.content = content
+        self.headers = headers or {'Content-Type': 'text/html'}
 
 
 class DummyHttp(Http):
     def get(self, url, username, password):
-        if url == URLs.personal(get_current_academic_year()[0], ''):
-            with open('tests/pages/personal.html') as f:
-                return DummyResponse(f.read())
+        year = get_current_academic_year()[0]
+        if url == URLs.personal(year, ''):
+            page = 'personal'
+        elif url == URLs.timetable(year, '4', 'c1', ''):
+            page = 'timetable'
+        elif url.startswith(URLs.module_notes('')):
+            page = 'notes'
+        else:
+            return None
+
+        with open('tests/pages/{}.html'.format(page), 'rb') as f:
+            return DummyResponse(f.read())
+
+
+class UserRecordingHttp(DummyHttp):
+    def __init__(self, user_agent):
+        super().__init__(user_agent)
+        self.users = []
+
+    def get(self, url, username, password):
+        self.users.append((url, username))
+        if url == CATE_BASE_URL:
+            return DummyResponse(b'')
+        return super().get(url, username, password)
+
+
+class CountingHttp(DummyHttp):
+    def __init__(self, user_agent):
+        super().__init__(user_agent)
+        self.urls = []
+
+    def get(self, url, username, password):
+        self.urls.append(url)
+        return super().get(url, username, password)
@@ -0,0 +1,153 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from pycate.cate import CATe
+from pycate.exceptions import ClientException
+from pycate.http import Http
+from pycate.models import SubmissionStatus
+from pycate.multipart import MultipartEncoder
+
+
+class TestMultipartEncoder:
+    def test_streams_files(self, tmp_path):
+        path = tmp_path / 'report.pdf'
+        path.write_bytes(b'x' * 100000)
+
+        progress = []
+        body = MultipartEncoder(
+            fields={'key': 'value'},
+            files=[('file', str(path))],
+            boundary='BOUNDARY',
+            callback=lambda sent, total: progress.append((sent, total)))
+
+        chunks = []
+        while True:
+            chunk = body.read(8192)
+            if not chunk:
+                break
+            assert len(chunk) <= 8192
+            chunks.append(chunk)
+        data = b''.join(chunks)
+
+        assert len(data) == len(body)
+        assert progress[-1] == (len(body), len(body))
+        assert data.startswith(
+            b'--BOUNDARY\r\nContent-Disposition: form-data; name="key"')
+        assert b'filename="report.pdf"\r\nContent-Type: application/pdf' \
+            in data
+        assert b'x' * 100000 + b'\r\n--BOUNDARY--\r\n' in data
+
+
+class StandInServer(HTTPServer):
+    def __init__(self, address):
+        super().__init__(address, StandInHandler)
+        self.handed_in = {}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/personal.cgi'):
+            page = 'personal'
+        elif self.path.startswith('/timetable.cgi'):
+            page = 'timetable'
+        else:
+            self.send_error(404)
+            return
+
+        with open('tests/pages/{}.html'.format(page)) as f:
+            body = f.read()
+
+        if '2017:4:101:c1:new:CATE_TEST_LOGIN' in self.server.handed_in:
+            body = body.replace(
+                'bgcolor="#ccffcc" style="border: 2px solid red"',
+                'bgcolor="#ccffcc"')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def do_POST(self):
+        key = self.path.split('=')[-1]
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        if key.startswith('2017:4:103'):
+            self.send_error(500)
+            return
+
+        self.server.handed_in[key] = body
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHandin:
+    @pytest.fixture(name="server")
+    def create_stand_in_server(self):
+        server = StandInServer(('127.0.0.1', 0))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        yield server
+
+        server.shutdown()
+        server.server_close()
+
+    @pytest.fixture(name="cate")
+    def create_stand_in_cate(self, server):
+        base_url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        return CATe('tests', http=Http('tests', base_url=base_url))
+
+    def test_submit_exercises(self, server, cate, tmp_path):
+        cw = tmp_path / 'cw.zip'
+        cw.write_bytes(b'coursework' * 1000)
+        lab = tmp_path / 'lab.hs'
+        lab.write_bytes(b'main = pure ()')
+
+        exercises = {e.code: e for e in cate.get_exercise_timetable()}
+        progress = {}
+
+        def on_progress(exercise, sent, total):
+            progress[exercise.code] = (sent, total)
+
+        results = cate.submit_exercises(
+            [(exercises['1:CW'], [str(cw)]), (exercises['3:LAB'], [str(lab)])],
+            progress=on_progress)
+
+        assert results[0].accepted
+        assert results[0].verified
+        assert results[0].submission_status is SubmissionStatus.OK
+        assert results[0].bytes_sent == progress['1:CW'][0] == \
+            progress['1:CW'][1]
+        assert b'coursework' * 1000 in \
+            server.handed_in['2017:4:101:c1:new:CATE_TEST_LOGIN']
+
+        assert results[1].status_code == 500
+        assert not results[1].verified
+        assert results[1].submission_status is \
+            SubmissionStatus.INCOMPLETE_SUBMISSION_DUE_SOON
+
+    def test_failed_upload_keeps_other_results(self, cate, tmp_path):
+        cw = tmp_path / 'cw.zip'
+        cw.write_bytes(b'coursework')
+
+        exercises = {e.code: e for e in cate.get_exercise_timetable()}
+        results = cate.submit_exercises([
+            (exercises['1:CW'], [str(cw)]),
+            (exercises['3:LAB'], [str(tmp_path / 'missing.hs')])])
+
+        assert results[0].verified
+        assert results[0].error is None
+        assert results[1].status_code is None
+        assert not results[1].accepted
+        assert isinstance(results[1].error, FileNotFoundError)
+
+    def test_submit_without_handin_link(self, cate):
+        exercises = {e.code: e for e in cate.get_exercise_timetable()}
+
+        with pytest.raises(ClientException):
+            cate.submit_exercise(exercises['2:TUT'], [])
@@ -0,0 +1,59 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from pycate.const import CATE_BASE_URL
+from pycate.http import Http, get_charset, get_wire_bytes
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with open('tests/pages/timetable.html', 'rb') as f:
+            body = f.read()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttp:
+    @pytest.fixture(name="http")
+    def create_http(self):
+        server = HTTPServer(('127.0.0.1', 0), GzipHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        yield Http('tests', base_url='http://127.0.0.1:{}/'.format(
+            server.server_address[1]))
+
+        server.shutdown()
+        server.server_close()
+
+    def test_compressed_transfer(self, http):
+        response = http.get(CATE_BASE_URL + 'timetable.cgi', '', '')
+
+        with open('tests/pages/timetable.html', 'rb') as f:
+            assert response.content == f.read()
+        assert get_wire_bytes(response) < len(response.content)
+        assert get_charset(response) == 'utf-8'
+
+    def test_download(self, http, tmp_path):
+        path = str(tmp_path / 'timetable.html')
+
+        status_code = http.download(
+            CATE_BASE_URL + 'showfile.cgi?key=key', '', '', path)
+
+        assert status_code == 200
+        with open('tests/pages/timetable.html', 'rb') as f, \
+                open(path, 'rb') as downloaded:
+            assert downloaded.read() == f.read()
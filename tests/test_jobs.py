@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from pycate.cate import CATe
+from pycate.jobs import (
+    SQLiteBroker, Worker, cate_handlers, timetable_job, notes_job,
+    NOTES, TIMETABLE, DONE, FAILED, PENDING)
+from test_cate import CountingHttp
+
+
+class TestSQLiteBroker:
+    @pytest.fixture(name="broker")
+    def create_broker(self, tmp_path):
+        self.now = 1000
+        return SQLiteBroker(str(tmp_path / 'jobs.db'), clock=lambda: self.now)
+
+    def test_jobs_are_deduplicated(self, broker):
+        assert broker.put(*notes_job('2017:113', 'user1'))
+        assert not broker.put(*notes_job('2017:113', 'user2'))
+        assert broker.put(*timetable_job('user1', '4', 'c1'))
+        assert broker.counts() == {PENDING: 2}
+
+    def test_finished_jobs_can_be_queued_again(self, broker):
+        broker.put(*notes_job('2017:113'))
+        job = broker.claim('worker', lease=60)
+        assert not broker.put(*notes_job('2017:113'))
+        broker.complete(job, ['note'])
+
+        assert not broker.put(*notes_job('2017:113'), requeue_after=60)
+        self.now += 60
+        assert broker.put(*notes_job('2017:113'), requeue_after=60)
+        assert broker.counts() == {PENDING: 1}
+        assert broker.result(job.key) is None
+
+        job = broker.claim('worker', lease=60)
+        assert job.attempts == 1
+        broker.fail(job, 'error', retry_delay=0)
+        broker.fail(broker.claim('worker', lease=60), 'error', retry_delay=0)
+        broker.fail(broker.claim('worker', lease=60), 'error', retry_delay=0)
+        assert broker.counts() == {FAILED: 1}
+        assert broker.put(*notes_job('2017:113'))
+
+    def test_close(self, broker):
+        broker.put(*notes_job('2017:113'))
+        db = broker._SQLiteBroker__connection()
+        broker.close()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.execute('SELECT 1')
+        # A new connection is opened when the broker is used again
+        assert broker.counts() == {PENDING: 1}
+        broker.close()
+
+    def test_expired_leases_are_reclaimed(self, broker):
+        broker.put(*notes_job('2017:113'))
+
+        job = broker.claim('worker1', lease=60)
+        assert job.payload['notes_key'] == '2017:113'
+        assert broker.claim('worker2', lease=60) is None
+
+        self.now += 61
+        reclaimed = broker.claim('worker2', lease=60)
+        assert reclaimed.id == job.id
+        assert reclaimed.attempts == 2
+
+        # The first worker has lost its lease
+        assert not broker.complete(job, 'stale')
+        assert broker.complete(reclaimed, ['note'])
+        assert broker.result(job.key) == ['note']
+
+    def test_expired_last_attempt_fails(self, broker):
+        broker.put(*notes_job('2017:113'), max_attempts=1)
+
+        broker.claim('worker1', lease=60)
+        self.now += 61
+        assert broker.claim('worker2', lease=60) is None
+        assert broker.counts() == {FAILED: 1}
+
+    def test_failed_jobs_are_retried(self, broker):
+        broker.put(*notes_job('2017:113'), max_attempts=2)
+
+        job = broker.claim('worker', lease=60)
+        assert broker.fail(job, 'error', retry_delay=10)
+        assert broker.claim('worker', lease=60) is None
+
+        self.now += 10
+        job = broker.claim('worker', lease=60)
+        assert broker.fail(job, 'error', retry_delay=10)
+        assert broker.counts() == {FAILED: 1}
+
+
+class TestWorker:
+    def test_scrape_cohort(self, tmp_path):
+        broker = SQLiteBroker(str(tmp_path / 'jobs.db'))
+        http = CountingHttp('tests')
+        cate = CATe('tests', http=http)
+
+        users = ['user{}'.format(i) for i in range(4)]
+        for user in users:
+            broker.put(*timetable_job(user))
+
+        handlers = cate_handlers(lambda user: cate, broker)
+        workers = [Worker(broker, handlers, poll_interval=0.01)
+                   for _ in range(3)]
+        threads = [threading.Thread(target=w.run, kwargs={
+            'exit_when_idle': True}) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert broker.counts() == {DONE: 5}
+
+        timetable = broker.result(timetable_job('user0')[1])
+        assert timetable['period'] == '4'
+        assert timetable['exercises'][0]['code'] == '1:CW'
+
+        # The notes page all four users share was only fetched once
+        notes = broker.result(notes_job(
+            '2017:113:1:c1:new:CATE_TEST_LOGIN')[1])
+        assert notes[0]['title'] == 'Introduction to Pipelining'
+        assert len([url for url in http.urls if 'notes.cgi' in url]) == 1
+
+    def test_handler_errors_are_retried(self, tmp_path):
+        broker = SQLiteBroker(str(tmp_path / 'jobs.db'))
+        broker.put(TIMETABLE, 'flaky', {}, max_attempts=3)
+        calls = []
+
+        def flaky(payload):
+            calls.append(1)
+            if len(calls) < 2:
+                raise ValueError()
+            return 'ok'
+
+        worker = Worker(broker, {TIMETABLE: flaky, NOTES: None},
+                        retry_delay=0)
+        worker.run(exit_when_idle=True)
+
+        assert len(calls) == 2
+        assert broker.result('flaky') == 'ok'
+
+    def test_leases_are_renewed_while_jobs_run(self, tmp_path):
+        broker = SQLiteBroker(str(tmp_path / 'jobs.db'))
+        broker.put(TIMETABLE, 'slow', {})
+        calls = []
+
+        def slow(payload):
+            calls.append(1)
+            time.sleep(1.5)
+            return 'ok'
+
+        stop = threading.Event()
+        workers = [Worker(broker, {TIMETABLE: slow}, lease=0.5,
+                          poll_interval=0.05) for _ in range(2)]
+        threads = [threading.Thread(target=w.run, args=(stop,))
+                   for w in workers]
+        for thread in threads:
+            thread.start()
+        time.sleep(2)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert broker.counts() == {DONE: 1}
+        assert broker.result('slow') == 'ok'
+
@@ -0,0 +1,151 @@
+import threading
+import time
+
+import requests
+
+from pycate.cache import Cache
+from pycate.cate import CATe
+from pycate.const import CATE_BASE_URL
+from pycate.http import Http
+from pycate.mock_server import MockCATeServer
+from pycate.models import SubmissionStatus
+
+
+def create_cate(server):
+    return CATe('tests', http=Http('tests', base_url=server.base_url))
+
+
+class HeldHttp(Http):
+    """Holds up the first timetable response after hold is set"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hold = None
+        self.fetched = threading.Event()
+
+    def get(self, url, username, password):
+        response = super().get(url, username, password)
+        hold = self.hold
+        if hold is not None and 'timetable.cgi' in url:
+            self.hold = None
+            self.fetched.set()
+            hold.wait(5)
+        return response
+
+
+class TestMockCATeServer:
+    def test_pages_parse(self):
+        with MockCATeServer(modules=10, exercises=6, notes=8) as server:
+            cate = create_cate(server)
+
+            assert cate.get_user_info().login == ''
+            assert cate.get_default_period_and_class() == ('1', 'c1')
+
+            modules = cate.get_modules()
+            assert len(modules) == 10
+            assert modules[3]['name'] == '103 - Module 103'
+
+            exercises = cate.get_exercise_timetable()
+            assert len(exercises) == 60
+            assert {e.submission_status for e in exercises} >= {
+                SubmissionStatus.OK, SubmissionStatus.NOT_SUBMITTED}
+
+            notes = cate.get_notes(modules[0]['notes_key'])
+            assert len(notes) == 8
+            assert notes[4]['type'] == 'URL'
+
+    def test_authentication(self):
+        with MockCATeServer(username='user', password='secret') as server:
+            cate = create_cate(server)
+
+            assert not cate.authenticate('user', 'wrong')
+            assert cate.authenticate('user', 'secret')
+            assert cate.get_user_info().login == 'user'
+
+    def test_throttling(self):
+        with MockCATeServer(rate_limit=5) as server:
+            http = Http('tests', base_url=server.base_url)
+            statuses = [http.get(CATE_BASE_URL, '', '').status_code
+                        for _ in range(10)]
+
+            assert statuses.count(200) >= 5
+            assert 429 in statuses
+            assert server.requests['throttled'] == statuses.count(429)
+
+    def test_latency_and_concurrency(self):
+        with MockCATeServer(latency=0.2) as server:
+            cate = create_cate(server)
+            results = []
+
+            def fetch():
+                results.append(cate.get_notes('2017:100:1:c1:new:user'))
+
+            threads = [threading.Thread(target=fetch) for _ in range(10)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # Requests are served concurrently
+            assert time.perf_counter() - start < 1
+            assert len(results) == 10
+            assert server.requests['notes.cgi'] == 10
+
+    def test_handin(self, tmp_path):
+        path = tmp_path / 'cw.zip'
+        path.write_bytes(b'coursework')
+
+        with MockCATeServer(modules=1, exercises=1) as server:
+            cate = create_cate(server)
+            exercise = cate.get_exercise_timetable()[0]
+            assert exercise.submission_status is SubmissionStatus.NOT_SUBMITTED
+
+            result = cate.submit_exercise(exercise, [str(path)])
+            assert result.verified
+
+    def test_handin_with_cache(self, tmp_path):
+        path = tmp_path / 'cw.zip'
+        path.write_bytes(b'coursework')
+
+        with MockCATeServer(modules=1, exercises=1) as server:
+            cate = CATe('tests', http=Http('tests', base_url=server.base_url),
+                        cache=Cache(ttl=300))
+            exercise = cate.get_exercise_timetable()[0]
+            assert exercise.submission_status is SubmissionStatus.NOT_SUBMITTED
+
+            result = cate.submit_exercise(exercise, [str(path)])
+            assert result.verified
+            assert cate.get_exercise_timetable()[0].submission_status is \
+                SubmissionStatus.OK
+
+    def test_handin_during_refresh(self, tmp_path):
+        path = tmp_path / 'cw.zip'
+        path.write_bytes(b'coursework')
+        now = [0]
+        cache = Cache(ttl=10, stale_ttl=300, clock=lambda: now[0])
+
+        with MockCATeServer(modules=1, exercises=1) as server:
+            http = HeldHttp('tests', base_url=server.base_url)
+            cate = CATe('tests', http=http, cache=cache)
+            exercise = cate.get_exercise_timetable()[0]
+
+            # A background refresh reads the timetable from before the
+            # upload and only finishes after it
+            now[0] = 20
+            hold = http.hold = threading.Event()
+            cate.get_exercise_timetable()
+            assert http.fetched.wait(5)
+
+            result = cate.submit_exercise(exercise, [str(path)])
+            hold.set()
+            cache.close()
+
+            assert result.verified
+            assert cate.get_exercise_timetable()[0].submission_status is \
+                SubmissionStatus.OK
+
+    def test_unknown_page(self):
+        with MockCATeServer() as server:
+            response = requests.get(server.base_url + 'missing.cgi')
+            assert response.status_code == 404
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from pycate.models import Exercise, AssessedStatus, SubmissionStatus
+from pycate.reminders import ReminderScheduler
+
+NOW = datetime(2018, 1, 1)
+
+
+def exercise(code, end, status=SubmissionStatus.NOT_SUBMITTED):
+    return Exercise('100', 'Computers', code, 'Exercise', '2018-01-01', end,
+                    AssessedStatus.ASSESSED_INDIVIDUAL, status, {}, None)
+
+
+class TestReminderScheduler:
+    def setup_method(self):
+        self.fired = []
+        self.scheduler = ReminderScheduler(
+            [timedelta(hours=1), timedelta(days=1)], self.fired.append)
+
+    def ingest(self, user, *exercises, now=NOW):
+        self.scheduler.ingest(user, exercises, now)
+
+    def test_reminders_fire_at_lead_times(self):
+        self.ingest('user', exercise('1:CW', '2018-01-05'),
+                    exercise('2:CW', '2018-01-10'))
+
+        assert self.scheduler.tick(datetime(2018, 1, 4, 23, 58)) == []
+        self.scheduler.tick(datetime(2018, 1, 4, 23, 59))
+        assert [(r.exercise.code, r.lead_time) for r in self.fired] == [
+            ('1:CW', timedelta(days=1))]
+
+        self.scheduler.tick(datetime(2018, 1, 5, 23, 0))
+        assert self.fired[-1].lead_time == timedelta(hours=1)
+        assert self.scheduler.next_due() == datetime(2018, 1, 9, 23, 59)
+
+    def test_submitted_exercises_are_cancelled(self):
+        self.ingest('user', exercise('1:CW', '2018-01-05'))
+        self.ingest('user',
+                    exercise('1:CW', '2018-01-05', SubmissionStatus.OK))
+
+        assert len(self.scheduler) == 0
+        assert self.scheduler.next_due() is None
+        assert self.scheduler.tick(datetime(2018, 2, 1)) == []
+
+    def test_updates_replace_reminders(self):
+        self.ingest('user', exercise('1:CW', '2018-01-05'))
+        self.ingest('user', exercise('1:CW', '2018-01-08'))
+        # Ingesting the same state again doesn't duplicate reminders
+        self.ingest('user', exercise('1:CW', '2018-01-08'))
+
+        fired = self.scheduler.tick(datetime(2018, 2, 1))
+        assert [r.due for r in fired] == [
+            datetime(2018, 1, 7, 23, 59), datetime(2018, 1, 8, 22, 59)]
+
+    def test_users_are_separate(self):
+        self.ingest('user1', exercise('1:CW', '2018-01-05'))
+        self.ingest('user2',
+                    exercise('1:CW', '2018-01-05', SubmissionStatus.OK))
+
+        fired = self.scheduler.tick(datetime(2018, 2, 1))
+        assert {r.user for r in fired} == {'user1'}
+
+    def test_past_reminders_are_skipped(self):
+        self.ingest('user', exercise('1:CW', '2017-01-05'),
+                    exercise('2:CW', '2018-01-05'),
+                    now=datetime(2018, 1, 5, 12))
+
+        fired = self.scheduler.tick(datetime(2018, 2, 1))
+        assert [(r.exercise.code, r.lead_time) for r in fired] == [
+            ('2:CW', timedelta(hours=1))]
+
+    def test_duplicate_lead_times(self):
+        scheduler = ReminderScheduler([timedelta(days=1)] * 2,
+                                      self.fired.append)
+        scheduler.ingest('user', [exercise('1:CW', '2018-01-05'),
+                                  exercise('2:CW', '2018-01-05')], NOW)
+
+        assert len(scheduler) == 2
+        assert len(scheduler.tick(datetime(2018, 2, 1))) == 2
+
+    def test_cancelled_reminders_are_compacted(self):
+        for i in range(1000):
+            status = SubmissionStatus.OK if i % 2 else \
+                SubmissionStatus.NOT_SUBMITTED
+            self.ingest('user', exercise('1:CW', '2018-01-05', status))
+
+        assert len(self.scheduler) == 0
+        assert len(self.scheduler._ReminderScheduler__heap) <= 64 + 2
+
+        self.ingest('user', exercise('1:CW', '2018-01-05'))
+        assert len(self.scheduler) == 2
+        assert len(self.scheduler.tick(datetime(2018, 2, 1))) == 2
+
+    def test_callback_errors_dont_stop_other_reminders(self):
+        delivered = []
+
+        def callback(reminder):
+            if reminder.exercise.code == '1:CW':
+                raise ValueError()
+            delivered.append(reminder.exercise.code)
+
+        scheduler = ReminderScheduler([timedelta(days=1)], callback)
+        scheduler.ingest('user', [exercise('1:CW', '2018-01-05'),
+                                  exercise('2:CW', '2018-01-06')], NOW)
+
+        assert len(scheduler.tick(datetime(2018, 2, 1))) == 2
+        assert delivered == ['2:CW']
@@ -0,0 +1,73 @@
+import pytest
+
+from pycate.cate import CATe
+from pycate.search import NotesIndex
+from test_cate import DummyHttp
+
+
+class TestNotesIndex:
+    @pytest.fixture(name="index")
+    def create_index(self, tmp_path):
+        self.path = str(tmp_path / 'notes.db')
+        with NotesIndex(self.path) as index:
+            yield index
+
+    @pytest.fixture(name="notes")
+    def get_notes(self):
+        cate = CATe('tests', http=DummyHttp('tests'))
+        return cate.get_notes('2017:113:1:c1:new:CATE_TEST_LOGIN')
+
+    def test_update_from_cate(self, index):
+        cate = CATe('tests', http=DummyHttp('tests'))
+
+        assert index.update(cate) == 3
+        assert index.update(cate) == 0
+
+        results = index.search('pipelining')
+        assert [r['title'] for r in results] == ['Introduction to Pipelining']
+        assert results[0]['module'] == '113 - Architecture'
+        assert results[0]['link'] == '2017:113:1:c1:NOTES:ab123'
+
+    def test_ranking(self, index, notes):
+        index.update_module('113 - Architecture', 'key', notes)
+
+        results = index.search('architecture caches')
+        assert len(results) == 3
+        assert results[0]['title'] == 'Caches and Memory Hierarchy'
+
+        assert [r['owner'] for r in index.search('cd456')] == ['cd456']
+        assert index.search('nonexistent') == []
+
+    def test_incremental_update(self, index, notes):
+        index.update_module('113 - Architecture', 'key', notes)
+
+        notes = [dict(n) for n in notes[:2]]
+        notes[0]['title'] = 'Introduction to Superscalar'
+        assert index.update_module('113 - Architecture', 'key', notes) == 1
+
+        assert len(index) == 2
+        assert index.search('pipelining') == []
+        assert index.search('superscalar')[0]['number'] == '1'
+        assert index.search('website') == []
+
+    def test_extracted_text(self, index, notes):
+        index.update_module(
+            '113 - Architecture', 'key', notes,
+            text_extractor=lambda note: 'branch prediction'
+            if note['number'] == '1' else None)
+
+        assert index.search('branch')[0]['number'] == '1'
+        assert index.add_text('key', '2', 'tomasulo algorithm')
+        assert index.search('tomasulo')[0]['number'] == '2'
+
+        # Text is kept when the note's metadata is updated
+        assert index.update_module('113 - Architecture', 'key', notes) == 0
+        assert index.search('tomasulo')[0]['number'] == '2'
+
+    def test_survives_restart(self, index, notes):
+        index.update_module('113 - Architecture', 'key', notes)
+        index.close()
+
+        with NotesIndex(self.path) as reopened:
+            assert len(reopened) == 3
+            assert reopened.search('memory')[0]['number'] == '2'
@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from pycate.cate import CATe
+from pycate.server import CATeServer
+from test_cate import CountingHttp
+
+
+class SlowHttp(CountingHttp):
+    def get(self, url, username, password):
+        time.sleep(0.05)
+        return super().get(url, username, password)
+
+
+class TestCATeServer:
+    @pytest.fixture(name="server")
+    def create_server(self):
+        self.http = SlowHttp('tests')
+        server = CATeServer(
+            CATe('tests', http=self.http), address=('127.0.0.1', 0))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        yield server
+
+        server.shutdown()
+        server.server_close()
+
+    @staticmethod
+    def fetch(server, path):
+        url = 'http://127.0.0.1:{}{}'.format(server.server_address[1], path)
+        with urllib.request.urlopen(url) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def test_endpoints(self, server):
+        assert self.fetch(server, '/user_info')['login'] == 'CATE_TEST_LOGIN'
+        assert self.fetch(server, '/modules')[0]['name'] == \
+            '113 - Architecture'
+
+        exercises = self.fetch(server, '/exercises?period=4&class=c1')
+        assert exercises[0]['code'] == '1:CW'
+        assert exercises[0]['submission_status'] == 'N-S'
+
+        notes = self.fetch(server, '/notes?key=2017:113:1:c1:new:user')
+        assert notes[1]['title'] == 'Caches and Memory Hierarchy'
+
+    def test_unknown_endpoint(self, server):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            self.fetch(server, '/unknown')
+        assert e.value.code == 404
+
+    def test_concurrent_requests_are_coalesced(self, server):
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.fetch(server, '/user_info')))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 8
+        assert len(self.http.urls) == 1
+
+        # Later requests are answered from the cache
+        server.get('/user_info', {})
+        assert len(self.http.urls) == 1
@@ -0,0 +1,136 @@
+import struct
+
+import pytest
+
+from pycate.cate import CATe
+from pycate.exceptions import SnapshotException
+from pycate.models import SubmissionStatus
+from pycate.server import CATeServer
+from pycate.snapshot import Snapshot
+from test_cate import CountingHttp
+
+NOTES_KEY = '2017:113:1:c1:new:CATE_TEST_LOGIN'
+
+
+class TestSnapshot:
+    @pytest.fixture(name="snapshot")
+    def capture_snapshot(self):
+        return Snapshot.capture(CATe('tests', http=CountingHttp('tests')))
+
+    @pytest.fixture(name="path")
+    def snapshot_path(self, snapshot, tmp_path):
+        path = str(tmp_path / 'snapshot.bin')
+        snapshot.save(path)
+        return path
+
+    def test_round_trip(self, snapshot, path):
+        with Snapshot.load(path) as loaded:
+            assert loaded.created == snapshot.created
+            assert loaded.user_info.to_dict() == snapshot.user_info.to_dict()
+            assert loaded.default_period_and_class == ('4', 'c1')
+            assert loaded.timetable_keys() == [('4', 'c1')]
+            assert loaded.get_modules() == snapshot.get_modules('4', 'c1')
+
+            exercises = loaded.get_exercise_timetable('4', 'c1')
+            assert [e.to_dict() for e in exercises] == \
+                [e.to_dict() for e in snapshot.get_exercise_timetable()]
+            assert exercises[1].submission_status is SubmissionStatus.OK
+
+            assert loaded.get_notes(NOTES_KEY) == snapshot.get_notes(NOTES_KEY)
+            assert loaded.get_notes('missing') is None
+            assert loaded.get_exercise_timetable('1', 'c1') is None
+
+        # Everything is decoded before the file is unmapped
+        assert loaded.get_notes(NOTES_KEY)[0]['title'] == \
+            'Introduction to Pipelining'
+
+    def test_empty_snapshot(self, tmp_path):
+        path = str(tmp_path / 'empty.bin')
+        Snapshot().save(path)
+
+        with Snapshot.load(path) as loaded:
+            assert loaded.user_info is None
+            assert loaded.default_period_and_class is None
+            assert loaded.get_modules() is None
+
+    def test_strings_are_stored_once(self, snapshot, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        assert data.count(b'title') == 1
+
+    @pytest.mark.parametrize('offset, value', [
+        (0, b'XXXX'), (4, struct.pack('<H', 99)), (-1, b'\0')])
+    def test_invalid_files_are_rejected(self, path, offset, value):
+        with open(path, 'r+b') as f:
+            f.seek(offset, 0 if offset >= 0 else 2)
+            f.write(value)
+
+        with pytest.raises(SnapshotException):
+            Snapshot.load(path)
+
+    def test_truncated_file_is_rejected(self, path):
+        with open(path, 'r+b') as f:
+            f.truncate(100)
+
+        with pytest.raises(SnapshotException):
+            Snapshot.load(path)
+
+        with open(path, 'r+b') as f:
+            f.truncate(10)
+
+        with pytest.raises(SnapshotException):
+            Snapshot.load(path)
+
+    def test_load_is_lazy(self, snapshot, tmp_path):
+        exercises = snapshot.get_exercise_timetable() * 2000
+        big = Snapshot(snapshot.user_info, ('4', 'c1'),
+                       {('4', 'c1'): (snapshot.get_modules(), exercises),
+                        ('5', 'c1'): (snapshot.get_modules(), exercises)},
+                       {NOTES_KEY: snapshot.get_notes(NOTES_KEY)})
+        path = str(tmp_path / 'big.bin')
+        big.save(path)
+
+        # Loading only indexes where each timetable and set of notes is
+        loaded = Snapshot.load(path)
+        timetables = loaded._Snapshot__timetables
+        notes = loaded._Snapshot__notes
+        assert all(isinstance(t, int) for t in timetables.values())
+        assert all(isinstance(n, int) for n in notes.values())
+
+        assert len(loaded.get_exercise_timetable()) == 6000
+        assert isinstance(timetables[('4', 'c1')], tuple)
+        assert isinstance(timetables[('5', 'c1')], int)
+        loaded.close()
+
+    def test_server_serves_snapshot(self, path):
+        http = CountingHttp('tests')
+        server = CATeServer(CATe('tests', http=http),
+                            address=('127.0.0.1', 0), stale_ttl=60)
+        try:
+            with Snapshot.load(path) as snapshot:
+                server.load_snapshot(snapshot)
+
+            body = server.get('/exercises', {})
+            assert b'Pipelining' in body
+            assert server.get('/notes', {'key': NOTES_KEY}) is not None
+
+            # Stale responses are refreshed from CATe in the background
+            server.cache.wait()
+            assert http.urls
+        finally:
+            server.cache.close()
+            server.server_close()
+
+    def test_server_without_stale_ttl_serves_snapshot(self, path):
+        http = CountingHttp('tests')
+        server = CATeServer(CATe('tests', http=http),
+                            address=('127.0.0.1', 0))
+        try:
+            with Snapshot.load(path) as snapshot:
+                server.load_snapshot(snapshot)
+
+            assert b'Pipelining' in server.get('/exercises', {})
+            assert b'CATE_TEST_LOGIN' in server.get('/user_info', {})
+            assert http.urls == []
+        finally:
+            server.server_close()
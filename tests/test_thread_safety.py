@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pycate.cache import Cache
+from pycate.cate import CATe
+from pycate.exceptions import ClientException
+from pycate.http import Http
+from pycate.mock_server import MockCATeServer
+
+
+def scrape(cate):
+    """Calls every get_* method, returning comparable results"""
+    modules = cate.get_modules()
+    return {
+        'user_info': cate.get_user_info().to_dict(),
+        'default': cate.get_default_period_and_class(),
+        'modules': modules,
+        'exercises': [e.to_dict() for e in cate.get_exercise_timetable()],
+        'notes': cate.get_notes(modules[0]['notes_key']),
+    }
+
+
+class TestThreadSafety:
+    @pytest.fixture(name="server")
+    def create_server(self):
+        with MockCATeServer(modules=4, exercises=3, notes=4) as server:
+            yield server
+
+    @pytest.mark.parametrize("cache", [None, Cache(ttl=0.05)])
+    def test_shared_instance(self, server, cache):
+        cate = CATe('tests', http=Http('tests', base_url=server.base_url),
+                    cache=cache, thread_safe=True)
+        assert cate.authenticate('user', 'password')
+        expected = scrape(cate)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: scrape(cate), range(24)))
+
+        assert all(result == expected for result in results)
+
+    def test_users_sharing_a_pool(self, server):
+        cate = CATe('tests', http=Http('tests', base_url=server.base_url),
+                    cache=Cache(ttl=60), thread_safe=True)
+        users = [cate.for_user('user{}'.format(i), 'password')
+                 for i in range(3)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda i: (i % 3, scrape(users[i % 3])), range(24)))
+
+        for i, result in results:
+            assert result['user_info']['login'] == 'user{}'.format(i)
+            assert result['modules'][0]['notes_key'].endswith(
+                ':user{}'.format(i))
+
+    def test_credentials_are_immutable(self, server):
+        cate = CATe('tests', http=Http('tests', base_url=server.base_url),
+                    thread_safe=True)
+        assert cate.authenticate('user', 'password')
+
+        with pytest.raises(ClientException):
+            cate.authenticate('other', 'password')
+        assert cate.get_user_info().login == 'user'